@@ -6,11 +6,18 @@ Agentic TV Controller
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from app.config import settings
-from app.routers import command, profiles
+from app.routers import command, debug, devices, macros, profiles
+from app.services.adb import close_shell_sessions
+from app.services.agent import close_agent
+from app.services.connection import start_heartbeats, stop_heartbeats
 from app.services.database import init_db, close_db
+from app.services.metrics import render as render_metrics
+from app.services.scheduler import close_schedulers
 from app.services.tv_tools import ALL_TOOLS
+from app.services.warmup import readiness, start_warmup, stop_warmup
 
 
 @asynccontextmanager
@@ -19,7 +26,8 @@ async def lifespan(app: FastAPI):
     print("🚀 TV Agent")
     print(f"   LiteLLM: {settings.LITELLM_BASE_URL}")
     print(f"   Model: {settings.LITELLM_MODEL}")
-    print(f"   TV: {settings.ANDROID_TV_IP}:{settings.ADB_PORT}")
+    for name, serial in settings.DEVICES.items():
+        print(f"   TV [{name}]: {serial}")
     print(f"   Tools: {len(ALL_TOOLS)}")
     
     try:
@@ -28,9 +36,18 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"   ✗ Database error: {e}")
     
+    # ADB / LLM / OCR 在背景同時預熱，狀態見 /health
+    start_warmup()
+    start_heartbeats()
+    
     yield
     
+    await stop_warmup()
+    await stop_heartbeats()
+    await close_agent()
+    await close_schedulers()
     await close_db()
+    await close_shell_sessions()
     print("Shutting down...")
 
 
@@ -43,18 +60,34 @@ app = FastAPI(
 # Include routers
 app.include_router(command.router, tags=["Command"])
 app.include_router(profiles.router, prefix="/profiles", tags=["Profiles"])
+app.include_router(devices.router, prefix="/devices", tags=["Devices"])
+app.include_router(macros.router, prefix="/macros", tags=["Macros"])
+app.include_router(debug.router, prefix="/debug", tags=["Debug"])
 
 
 @app.get("/health")
 async def health():
     from app.services.database import db_pool
     return {
-        "status": "ok",
+        **readiness(),
         "tools_count": len(ALL_TOOLS),
         "database": "connected" if db_pool else "disconnected"
     }
 
 
+@app.get("/health/ready")
+async def health_ready():
+    """預熱完成前回傳 503"""
+    state = readiness()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/tools")
 async def list_tools():
     return {"tools": [t.name for t in ALL_TOOLS]}
@@ -2,25 +2,46 @@
 Command router
 """
 
+import asyncio
+import json
+
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 
+from app.config import settings
 from app.schemas.models import CommandRequest, CommandResponse
 from app.services.database import get_user_profile
-from app.services.agent import process_command
+from app.services.agent import EventCallback, process_command
+from app.services.command_cache import cache_stats, clear_cache
+from app.services.intents import intent_stats
+from app.services.metrics import stage
+from app.services.tracing import start_trace
 
 router = APIRouter()
 
 
-@router.post("/command", response_model=CommandResponse)
-async def handle_command(request: CommandRequest):
-    """處理自然語言指令"""
+async def handle_command_events(request: CommandRequest, on_event: EventCallback | None = None) -> CommandResponse:
+    """處理指令並回傳結果，on_event 會收到進度事件"""
+    with start_trace("command", text=request.text, device=request.device_id, user_id=request.user_id) as trace:
+        response = await _handle_command(request, on_event)
+        if trace and not response.success:
+            trace.error = response.message
+    if trace:
+        response.trace_id = trace.trace_id
+    return response
+
+
+async def _handle_command(request: CommandRequest, on_event: EventCallback | None) -> CommandResponse:
     try:
+        device_id = settings.resolve_device(request.device_id)
+        
         # Get user profile if user_id provided
         user_profile = None
         if request.user_id:
             user_profile = await get_user_profile(request.user_id)
         
-        message, tool_results = await process_command(request.text, user_profile)
+        with stage("command"):
+            message, tool_results = await process_command(request.text, user_profile, device_id, on_event)
         
         return CommandResponse(
             success=True,
@@ -34,3 +55,72 @@ async def handle_command(request: CommandRequest):
             message=f"Error: {str(e)}",
             tool_calls=[]
         )
+
+
+@router.post("/command", response_model=CommandResponse)
+async def handle_command(request: CommandRequest):
+    """處理自然語言指令"""
+    return await handle_command_events(request)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/command/stream")
+async def handle_command_stream(request: CommandRequest):
+    """
+    處理自然語言指令 (Server-Sent Events)
+    
+    依序送出 llm_started, tool_call_decided, tool_started, tool_finished，
+    最後以 done 事件回傳和 /command 相同內容的結果。
+    """
+    queue: asyncio.Queue[tuple[str, dict]] = asyncio.Queue()
+    
+    def emit(event: str, data: dict) -> None:
+        queue.put_nowait((event, data))
+    
+    async def run() -> None:
+        response = await handle_command_events(request, emit)
+        emit("done", response.model_dump())
+    
+    async def events():
+        # 用戶端斷線時 task 仍會跑完，避免電視停在操作到一半的狀態
+        task = asyncio.create_task(run())
+        yield _sse("accepted", {"text": request.text})
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), timeout=15)
+            except asyncio.TimeoutError:
+                # 長流程 (例如 YouTube 帳號辨識) 期間維持連線
+                yield ": keep-alive\n\n"
+                continue
+            yield _sse(event, data)
+            if event == "done":
+                break
+        await task
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/intents")
+async def get_intents():
+    """Intent fast-path 規則與命中率"""
+    return intent_stats()
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    """指令快取的命中率統計"""
+    return cache_stats()
+
+
+@router.delete("/cache")
+async def delete_cache():
+    """清空指令快取"""
+    await clear_cache()
+    return {"message": "Cache cleared"}
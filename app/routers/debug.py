@@ -0,0 +1,31 @@
+"""
+Debug router - request traces
+"""
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.services.tracing import get_trace, list_traces, render_waterfall, waterfall
+
+router = APIRouter()
+
+
+@router.get("/traces")
+async def get_traces(limit: int = Query(50, ge=1, le=1000)):
+    """最近的請求 trace (新的在前)"""
+    return list_traces(limit)
+
+
+@router.get("/traces/{trace_id}")
+async def get_trace_detail(trace_id: str, format: str = Query("json", pattern="^(json|text)$")):
+    """
+    單一 trace 的 waterfall
+    
+    format=text 回傳純文字的時間軸，方便直接用 curl 看。
+    """
+    trace = get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace '{trace_id}' not found")
+    if format == "text":
+        return PlainTextResponse(render_waterfall(trace))
+    return waterfall(trace)
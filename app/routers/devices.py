@@ -0,0 +1,44 @@
+"""
+Devices router - TV registry
+"""
+
+from fastapi import APIRouter, HTTPException
+
+from app.config import settings
+from app.schemas.models import DeviceResponse
+from app.services.adb import shell_session_states
+from app.services.connection import get_connection_manager
+from app.services.scheduler import queue_depths
+
+router = APIRouter()
+
+
+@router.get("", response_model=list[DeviceResponse])
+async def list_devices():
+    """列出所有已註冊的電視"""
+    sessions = shell_session_states()
+    queued = queue_depths()
+    return [
+        DeviceResponse(
+            name=name,
+            serial=serial,
+            connected=get_connection_manager(serial).connected,
+            session_alive=sessions.get(serial, False),
+            queued=queued.get(serial, 0),
+        )
+        for name, serial in settings.DEVICES.items()
+    ]
+
+
+@router.post("/{device}/connect")
+async def connect_device(device: str):
+    """連線到指定電視"""
+    try:
+        device_id = settings.resolve_device(device)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    manager = get_connection_manager(device_id)
+    manager.invalidate()
+    connected = await manager.check()
+    return {"device_id": device_id, "connected": connected}
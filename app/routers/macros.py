@@ -0,0 +1,121 @@
+"""
+Macros router - CRUD and execution of named tool-call sequences
+"""
+
+import asyncpg
+from fastapi import APIRouter, HTTPException
+
+from app.config import settings
+from app.schemas.models import MacroCreate, MacroResponse, MacroRunRequest, MacroRunResponse
+from app.services.connection import get_connection_manager
+from app.services.database import get_pool, get_user_profile
+from app.services.macros import (
+    MacroError, compile_macro, create_macro, delete_macro, execute_plan, get_macro, list_macros,
+    update_macro, validate_steps,
+)
+from app.services.scheduler import JobSuperseded, get_scheduler
+from app.services.tracing import start_trace
+
+router = APIRouter()
+
+
+def _require_db() -> None:
+    if not get_pool():
+        raise HTTPException(status_code=503, detail="Database not connected")
+
+
+def _validated_steps(macro: MacroCreate) -> list[dict]:
+    try:
+        return validate_steps([step.model_dump() for step in macro.steps])
+    except MacroError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@router.get("", response_model=list[MacroResponse])
+async def list_all_macros():
+    """列出所有 macros"""
+    _require_db()
+    return await list_macros()
+
+
+@router.get("/{name}", response_model=MacroResponse)
+async def get_one_macro(name: str):
+    """取得單一 macro"""
+    _require_db()
+    macro = await get_macro(name)
+    if not macro:
+        raise HTTPException(status_code=404, detail=f"Macro '{name}' not found")
+    return macro
+
+
+@router.post("", response_model=MacroResponse)
+async def create_new_macro(macro: MacroCreate):
+    """新增 macro"""
+    _require_db()
+    steps = _validated_steps(macro)
+    try:
+        await create_macro(macro.name, macro.description, steps)
+    except asyncpg.UniqueViolationError:
+        raise HTTPException(status_code=400, detail=f"Macro '{macro.name}' already exists")
+    return {"name": macro.name, "description": macro.description, "steps": steps}
+
+
+@router.put("/{name}", response_model=MacroResponse)
+async def update_existing_macro(name: str, macro: MacroCreate):
+    """更新 macro"""
+    _require_db()
+    steps = _validated_steps(macro)
+    if not await update_macro(name, macro.description, steps):
+        raise HTTPException(status_code=404, detail=f"Macro '{name}' not found")
+    return {"name": name, "description": macro.description, "steps": steps}
+
+
+@router.delete("/{name}")
+async def delete_existing_macro(name: str):
+    """刪除 macro"""
+    _require_db()
+    if not await delete_macro(name):
+        raise HTTPException(status_code=404, detail=f"Macro '{name}' not found")
+    return {"message": f"Macro '{name}' deleted"}
+
+
+@router.post("/{name}/run", response_model=MacroRunResponse)
+async def run_macro(name: str, request: MacroRunRequest | None = None):
+    """執行 macro (不經過 LLM)"""
+    _require_db()
+    request = request or MacroRunRequest()
+    macro = await get_macro(name)
+    if not macro:
+        raise HTTPException(status_code=404, detail=f"Macro '{name}' not found")
+    try:
+        device_id = settings.resolve_device(request.device_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    with start_trace("macro", name=name, device=request.device_id, user_id=request.user_id) as trace:
+        response = await _run_plan(macro, device_id, request.user_id)
+        if trace and not response.success:
+            trace.error = response.message
+    if trace:
+        response.trace_id = trace.trace_id
+    return response
+
+
+async def _run_plan(macro: dict, device_id: str, user_id: str | None) -> MacroRunResponse:
+    try:
+        user_profile = await get_user_profile(user_id) if user_id else None
+        plan = await compile_macro(macro["steps"], user_profile)
+
+        await get_connection_manager(device_id).ensure()
+        # 整個 macro 是單一 job，不會和其他請求的按鍵交錯
+        results = await get_scheduler(device_id).submit(
+            macro["steps"],
+            lambda steps: execute_plan(plan, user_profile),
+            mergeable=False,
+        )
+    except JobSuperseded as e:
+        return MacroRunResponse(success=False, message=f"✗ {e}")
+    except Exception as e:
+        return MacroRunResponse(success=False, message=f"Error: {str(e)}")
+
+    return MacroRunResponse(success=True, message=" | ".join(results), invocations=len(plan))
@@ -2,25 +2,178 @@
 Profiles router - CRUD for user profiles
 """
 
+import json
+
 import asyncpg
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 
-from app.schemas.models import ProfileCreate, ProfileResponse
-from app.services.database import get_pool, get_user_profile
+from app.config import settings
+from app.schemas.models import AccountTemplateResponse, BulkImportResponse, ProfileCreate, ProfileResponse
+from app.services.adb import current_device
+from app.services.database import get_pool, get_user_profile, invalidate_user_profile
 
 router = APIRouter()
 
 
+PROFILE_COLUMNS = ("user_id", "netflix_profile_index", "netflix_pin", "youtube_account_name")
+
+
 @router.get("", response_model=list[ProfileResponse])
-async def list_profiles():
-    """列出所有使用者 profiles"""
+async def list_profiles(
+    response: Response,
+    after: str | None = None,
+    limit: int | None = Query(None, ge=1, le=1000),
+):
+    """
+    列出使用者 profiles (依 user_id 排序)
+    
+    沒有帶 limit / after 時回傳全部 (和分頁之前的行為相同)；分頁時 (keyset，只帶 after
+    則每頁 100 筆) 還有下一頁的話 `X-Next-After` header 是下一次請求要帶的 `after`
+    """
+    pool = get_pool()
+    if not pool:
+        raise HTTPException(status_code=503, detail="Database not connected")
+    
+    if after is not None and limit is None:
+        limit = 100
+    
+    # 第一頁和之後的頁面分成兩個 statement：`$1 IS NULL OR user_id > $1` 在 generic plan
+    # 下無法用 index range scan，越後面的頁面越慢。LIMIT NULL 等於不限制
+    columns = ", ".join(PROFILE_COLUMNS)
+    async with pool.acquire() as conn:
+        if after is None:
+            rows = await conn.fetch(
+                f"SELECT {columns} FROM user_profiles ORDER BY user_id LIMIT $1",
+                None if limit is None else limit + 1
+            )
+        else:
+            rows = await conn.fetch(
+                f"SELECT {columns} FROM user_profiles WHERE user_id > $1 ORDER BY user_id LIMIT $2",
+                after, limit + 1
+            )
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-After"] = rows[-1]["user_id"]
+    return [dict(row) for row in rows]
+
+
+@router.post("/bulk", response_model=BulkImportResponse)
+async def bulk_upsert_profiles(profiles: list[ProfileCreate]):
+    """
+    批次新增 / 更新 profiles
+    
+    先用 COPY 寫進暫存表，再用一個 INSERT ... ON CONFLICT 合併；
+    同一個 user_id 出現多次時以最後一筆為準
+    """
     pool = get_pool()
     if not pool:
         raise HTTPException(status_code=503, detail="Database not connected")
+    if not profiles:
+        return {"inserted": 0, "updated": 0}
     
+    records = [
+        (i, p.user_id, p.netflix_profile_index, p.netflix_pin, p.youtube_account_name)
+        for i, p in enumerate(profiles)
+    ]
     async with pool.acquire() as conn:
-        rows = await conn.fetch("SELECT user_id, netflix_profile_index, netflix_pin, youtube_account_name FROM user_profiles")
-        return [dict(row) for row in rows]
+        async with conn.transaction():
+            await conn.execute("""
+                CREATE TEMP TABLE user_profiles_staging (
+                    ord INT,
+                    user_id VARCHAR(50),
+                    netflix_profile_index INT,
+                    netflix_pin VARCHAR(10),
+                    youtube_account_name VARCHAR(100)
+                ) ON COMMIT DROP
+            """)
+            await conn.copy_records_to_table(
+                "user_profiles_staging", records=records, columns=("ord", *PROFILE_COLUMNS)
+            )
+            rows = await conn.fetch("""
+                INSERT INTO user_profiles (user_id, netflix_profile_index, netflix_pin, youtube_account_name)
+                SELECT DISTINCT ON (user_id) user_id, netflix_profile_index, netflix_pin, youtube_account_name
+                FROM user_profiles_staging
+                ORDER BY user_id, ord DESC
+                ON CONFLICT (user_id) DO UPDATE
+                SET netflix_profile_index = EXCLUDED.netflix_profile_index,
+                    netflix_pin = EXCLUDED.netflix_pin,
+                    youtube_account_name = EXCLUDED.youtube_account_name,
+                    updated_at = NOW()
+                RETURNING (xmax = 0) AS inserted
+            """)
+    
+    await invalidate_user_profile()
+    inserted = sum(1 for row in rows if row["inserted"])
+    return {"inserted": inserted, "updated": len(rows) - inserted}
+
+
+@router.get("/export")
+async def export_profiles():
+    """以 NDJSON 串流匯出所有 profiles (一行一筆，格式同 /profiles/bulk 的元素)"""
+    pool = get_pool()
+    if not pool:
+        raise HTTPException(status_code=503, detail="Database not connected")
+    
+    async def stream():
+        async with pool.acquire() as conn:
+            # server-side cursor 需要在 transaction 內
+            async with conn.transaction():
+                query = f"SELECT {', '.join(PROFILE_COLUMNS)} FROM user_profiles ORDER BY user_id"
+                async for row in conn.cursor(query, prefetch=500):
+                    yield json.dumps(dict(row), ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="profiles.ndjson"'},
+    )
+
+
+# YouTube 帳號樣板：路徑要放在 /{user_id} 之前
+# OCR 相關模組很重，在 handler 內才 import (通常已由啟動預熱載入)
+@router.get("/youtube-templates", response_model=list[AccountTemplateResponse])
+async def list_youtube_templates():
+    """列出已登錄的 YouTube 帳號樣板"""
+    from app.services import account_templates
+    
+    await account_templates.load_templates()
+    return account_templates.list_templates()
+
+
+@router.post("/youtube-templates", response_model=list[AccountTemplateResponse])
+async def enroll_youtube_templates(device_id: str | None = None):
+    """
+    從電視目前的「誰在觀看」畫面登錄所有帳號的樣板
+    
+    先在電視上打開 YouTube 的帳號選擇畫面再呼叫
+    """
+    from app.services import account_templates
+    from app.services.youtube_ocr import enroll_youtube_accounts
+    
+    try:
+        serial = settings.resolve_device(device_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    await account_templates.load_templates()
+    token = current_device.set(serial)
+    try:
+        names = await enroll_youtube_accounts()
+    finally:
+        current_device.reset(token)
+    if not names:
+        raise HTTPException(status_code=422, detail="No YouTube accounts recognized on screen")
+    return [t for t in account_templates.list_templates() if t["name"] in names]
+
+
+@router.delete("/youtube-templates")
+async def delete_youtube_templates():
+    """刪除所有 YouTube 帳號樣板"""
+    from app.services import account_templates
+    
+    await account_templates.delete_templates()
+    return {"message": "YouTube account templates deleted"}
 
 
 @router.get("/{user_id}", response_model=ProfileResponse)
@@ -48,6 +201,7 @@ async def create_profile(profile: ProfileCreate):
                 """,
                 profile.user_id, profile.netflix_profile_index, profile.netflix_pin, profile.youtube_account_name
             )
+            await invalidate_user_profile(profile.user_id)
             return profile
         except asyncpg.UniqueViolationError:
             raise HTTPException(status_code=400, detail=f"Profile '{profile.user_id}' already exists")
@@ -71,6 +225,7 @@ async def update_profile(user_id: str, profile: ProfileCreate):
         )
         if result == "UPDATE 0":
             raise HTTPException(status_code=404, detail=f"Profile '{user_id}' not found")
+        await invalidate_user_profile(user_id)
         return profile
 
 
@@ -85,4 +240,5 @@ async def delete_profile(user_id: str):
         result = await conn.execute("DELETE FROM user_profiles WHERE user_id = $1", user_id)
         if result == "DELETE 0":
             raise HTTPException(status_code=404, detail=f"Profile '{user_id}' not found")
+        await invalidate_user_profile(user_id)
         return {"message": f"Profile '{user_id}' deleted"}
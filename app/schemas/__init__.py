@@ -1,4 +1,4 @@
 # Re-export for easier imports
-from app.schemas.models import CommandRequest, CommandResponse, ProfileCreate, ProfileResponse
+from app.schemas.models import AccountTemplateResponse, BulkImportResponse, CommandRequest, CommandResponse, DeviceResponse, MacroCreate, MacroResponse, MacroRunRequest, MacroRunResponse, MacroStep, ProfileCreate, ProfileResponse
 
-__all__ = ["CommandRequest", "CommandResponse", "ProfileCreate", "ProfileResponse"]
+__all__ = ["AccountTemplateResponse", "BulkImportResponse", "CommandRequest", "CommandResponse", "DeviceResponse", "MacroCreate", "MacroResponse", "MacroRunRequest", "MacroRunResponse", "MacroStep", "ProfileCreate", "ProfileResponse"]
@@ -9,12 +9,22 @@ from pydantic import BaseModel
 class CommandRequest(BaseModel):
     text: str
     user_id: Optional[str] = None
+    device_id: Optional[str] = None  # 裝置名稱或 ADB serial，未指定時使用預設電視
 
 
 class CommandResponse(BaseModel):
     success: bool
     message: str
     tool_calls: list[dict] = []
+    trace_id: str | None = None  # GET /debug/traces/{trace_id}
+
+
+class DeviceResponse(BaseModel):
+    name: str
+    serial: str
+    connected: bool = False
+    session_alive: bool = False
+    queued: int = 0
 
 
 class ProfileCreate(BaseModel):
@@ -29,3 +39,43 @@ class ProfileResponse(BaseModel):
     netflix_profile_index: int
     netflix_pin: Optional[str] = None
     youtube_account_name: Optional[str] = None
+
+
+class MacroStep(BaseModel):
+    name: str  # tool 名稱，或 "wait" (args: seconds)
+    args: dict = {}
+
+
+class MacroCreate(BaseModel):
+    name: str
+    description: Optional[str] = None
+    steps: list[MacroStep]
+
+
+class MacroResponse(BaseModel):
+    name: str
+    description: Optional[str] = None
+    steps: list[MacroStep]
+
+
+class MacroRunRequest(BaseModel):
+    user_id: Optional[str] = None
+    device_id: Optional[str] = None
+
+
+class MacroRunResponse(BaseModel):
+    success: bool
+    message: str
+    invocations: int = 0  # 編譯後的執行次數 (一個合併的 script 或一個單獨執行的 tool)
+    trace_id: str | None = None
+
+
+class BulkImportResponse(BaseModel):
+    inserted: int
+    updated: int
+
+
+class AccountTemplateResponse(BaseModel):
+    name: str
+    width: int
+    height: int
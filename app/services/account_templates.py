@@ -0,0 +1,177 @@
+"""
+YouTube account template matching
+
+「誰在觀看」畫面上的帳號是固定的幾個，不需要通用 OCR：每個帳號名稱先用 Tesseract
+辨識一次並把處理過的帳號列裁切存成樣板 (enroll)，之後直接在帳號列上用 NumPy 做
+normalized cross-correlation 找出每個樣板的位置，幾毫秒就能完成。
+樣板存在 Postgres 的 youtube_account_templates 表，啟動後第一次使用時載入記憶體。
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PIL import Image
+
+from app.config import settings
+from app.services.database import get_pool
+
+
+# account name → 樣板 (float32, 高度與帳號列相同)
+_templates: dict[str, np.ndarray] = {}
+_loaded = False
+
+
+def to_array(img: Image.Image) -> np.ndarray:
+    return np.asarray(img.convert("L"), dtype=np.float32)
+
+
+async def load_templates() -> dict[str, np.ndarray]:
+    """從資料庫載入樣板 (只載入一次)"""
+    global _loaded
+    pool = get_pool()
+    if not _loaded and pool:
+        async with pool.acquire() as conn:
+            rows = await conn.fetch("SELECT account_name, width, height, pixels FROM youtube_account_templates")
+        for row in rows:
+            pixels = np.frombuffer(row["pixels"], dtype=np.uint8).reshape(row["height"], row["width"])
+            _templates[row["account_name"]] = pixels.astype(np.float32)
+        _loaded = True
+    return _templates
+
+
+async def save_template(name: str, template: np.ndarray) -> None:
+    """新增或取代一個帳號的樣板"""
+    _templates[name] = template
+    pool = get_pool()
+    if pool:
+        height, width = template.shape
+        async with pool.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO youtube_account_templates (account_name, width, height, pixels)
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT (account_name) DO UPDATE
+                SET width = EXCLUDED.width, height = EXCLUDED.height, pixels = EXCLUDED.pixels, updated_at = NOW()
+                """,
+                name, width, height, template.astype(np.uint8).tobytes()
+            )
+
+
+async def delete_templates() -> None:
+    """刪除所有樣板"""
+    _templates.clear()
+    pool = get_pool()
+    if pool:
+        async with pool.acquire() as conn:
+            await conn.execute("DELETE FROM youtube_account_templates")
+
+
+def list_templates() -> list[dict]:
+    return [
+        {"name": name, "width": template.shape[1], "height": template.shape[0]}
+        for name, template in _templates.items()
+    ]
+
+
+def match_scores(band: np.ndarray, template: np.ndarray) -> np.ndarray:
+    """
+    Normalized cross-correlation of a template against every x offset of the band.
+
+    The template has the band's height, so it only slides horizontally.
+
+    Returns:
+        scores in [-1, 1], one per x offset
+    """
+    height, width = template.shape
+    band = band[:height]
+    if band.shape[0] != height or band.shape[1] < width:
+        return np.empty(0, dtype=np.float32)
+
+    t = template - template.mean()
+    t_norm = np.sqrt((t * t).sum())
+
+    # 分子：t 的平均為 0，所以不需要扣掉 window 的平均
+    windows = sliding_window_view(band, width, axis=1)  # (height, offsets, width)
+    numerator = np.einsum("how,hw->o", windows, t)
+
+    # 分母：用 prefix sum 算每個 window 的平方和與總和
+    n = height * width
+    col_sum = np.concatenate(([0.0], np.cumsum(band.sum(axis=0, dtype=np.float64))))
+    col_sq = np.concatenate(([0.0], np.cumsum((band.astype(np.float64) ** 2).sum(axis=0))))
+    win_sum = col_sum[width:] - col_sum[:-width]
+    win_sq = col_sq[width:] - col_sq[:-width]
+    win_norm = np.sqrt(np.maximum(win_sq - win_sum ** 2 / n, 0))
+
+    denominator = win_norm * t_norm
+    scores = np.zeros_like(numerator)
+    np.divide(numerator, denominator, out=scores, where=denominator > 0)
+    return scores
+
+
+def text_spans(pixels: np.ndarray, min_gap: int) -> list[tuple[int, int]]:
+    """
+    帳號列上每個名稱 (黑字) 的水平範圍 [start, end)
+
+    相隔不到 min_gap 的欄位視為同一個名稱 (字母間距、名稱中的空白)。
+    """
+    columns = np.flatnonzero((pixels < 128).any(axis=0))
+    if not columns.size:
+        return []
+    breaks = np.flatnonzero(np.diff(columns) >= min_gap)
+    starts = np.concatenate(([columns[0]], columns[breaks + 1]))
+    ends = np.concatenate((columns[breaks], [columns[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def match_accounts(band: Image.Image, offset_x: int, offset_y: int) -> list[dict]:
+    """
+    Find enrolled accounts in the processed account band.
+
+    Positions are counted from the left, so the result is only trusted when
+    every name on screen up to the last match was matched; an account
+    without a template in between would shift everyone after it.
+
+    Args:
+        band: processed band from crop_account_band
+        offset_x, offset_y: band position in 1080p screenshot coordinates
+
+    Returns:
+        List of dicts with 'name', 'x' (center) and 'y', sorted by x; empty if nothing
+        matched or an unmatched name lies between the matches
+    """
+    # 在 OCR worker thread 執行，event loop 可能同時在新增 / 刪除樣板，所以先取快照
+    templates = list(_templates.items())
+    if not templates:
+        return []
+
+    pixels = to_array(band)
+    matches = []
+    for name, template in templates:
+        scores = match_scores(pixels, template)
+        if not scores.size:
+            continue
+        best = int(scores.argmax())
+        if scores[best] >= settings.YOUTUBE_TEMPLATE_THRESHOLD:
+            matches.append({
+                "name": name, "x": offset_x + best + template.shape[1] // 2, "y": offset_y,
+                "score": float(scores[best]), "span": (best, best + template.shape[1]),
+            })
+
+    # 名稱相近的樣板可能落在同一個位置，只保留分數較高的
+    matches.sort(key=lambda m: -m["score"])
+    accounts = []
+    for match in matches:
+        width = match["span"][1] - match["span"][0]
+        if all(abs(match["x"] - a["x"]) >= width // 2 for a in accounts):
+            accounts.append(match)
+
+    accounts.sort(key=lambda a: a["x"])
+    if not accounts:
+        return []
+
+    # 最後一個符合的帳號左邊，每個名稱都必須被某個樣板蓋到；右邊的 (例如「新增帳戶」) 不影響位置
+    last_end = accounts[-1]["span"][1]
+    for start, end in text_spans(pixels, settings.YOUTUBE_NAME_MIN_GAP):
+        center = (start + end) / 2
+        if center < last_end and not any(a["span"][0] <= center < a["span"][1] for a in accounts):
+            return []
+    return [{"name": a["name"], "x": a["x"], "y": a["y"]} for a in accounts]
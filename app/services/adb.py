@@ -2,11 +2,20 @@
 ADB helper functions for TV control
 """
 
-import os
-import subprocess
-import time
+import asyncio
+import re
+import shlex
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, TypeVar
 
 from app.config import settings
+from app.services.adb_protocol import get_adb_client
+from app.services.metrics import ADB_COMMANDS, ADB_FAILURES, stage
+from app.services.tracing import span
+
+T = TypeVar("T")
 
 
 KEY_CODES = {
@@ -29,64 +38,472 @@ APPS = {
 }
 
 
-def adb_command(cmd: str, capture_output: bool = False) -> str | None:
-    """執行 ADB 指令"""
-    full_cmd = f"adb -s {settings.DEVICE_ID} {cmd}"
+# 目前操作的電視；由排程器在執行 job 前設定，tools 不需要自己傳 device_id
+current_device: ContextVar[str | None] = ContextVar("current_device", default=None)
+
+
+def get_device_id() -> str:
+    """目前操作中的電視 ADB serial"""
+    return current_device.get() or settings.DEVICE_ID
+
+
+async def adb_command(cmd: str, capture_output: bool = False) -> str | None:
+    """執行 ADB CLI 指令"""
+    proc = await asyncio.create_subprocess_exec(
+        "adb", "-s", get_device_id(), *shlex.split(cmd),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    stdout, _ = await proc.communicate()
     if capture_output:
-        result = subprocess.run(full_cmd, shell=True, capture_output=True, text=True)
-        return result.stdout.strip()
-    else:
-        os.system(full_cmd)
-        return None
+        return stdout.decode(errors="replace").strip()
+    return None
+
+
+# ADB 指令失敗時通知 (例如讓連線狀態快取失效)
+_failure_listeners: list[Callable[[str, BaseException], None]] = []
+
+
+def add_failure_listener(listener: Callable[[str, BaseException], None]) -> None:
+    """註冊 ADB 失敗事件的 callback: listener(device_id, error)"""
+    _failure_listeners.append(listener)
+
+
+def _notify_failure(device_id: str, error: BaseException) -> None:
+    ADB_FAILURES.inc()
+    for listener in _failure_listeners:
+        listener(device_id, error)
+
+
+def _use_socket() -> bool:
+    return settings.ADB_TRANSPORT == "socket"
+
+
+async def _with_server(request: Callable[[], Awaitable[T]]) -> T:
+    """socket transport: adb server 還沒啟動時，用 CLI 啟動一次再重試"""
+    try:
+        return await request()
+    except ConnectionRefusedError:
+        proc = await asyncio.create_subprocess_exec(
+            "adb", "start-server",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        await proc.wait()
+        return await request()
+
+
+# ==================== Host commands ====================
+async def adb_devices() -> dict[str, str]:
+    """列出 adb server 上的裝置 {serial: state}"""
+    ADB_COMMANDS.inc("devices")
+    with span("adb.devices"):
+        if _use_socket():
+            return await _with_server(get_adb_client().devices)
+        output = await adb_command("devices", capture_output=True) or ""
+    
+    devices = {}
+    for line in output.splitlines()[1:]:
+        if "\t" in line:
+            serial, state = line.split("\t", 1)
+            devices[serial] = state
+    return devices
+
+
+async def adb_connect(device_id: str) -> bool:
+    """adb connect，回傳是否連線成功"""
+    ADB_COMMANDS.inc("connect")
+    with span("adb.connect", device=device_id):
+        if _use_socket():
+            result = await _with_server(lambda: get_adb_client().connect(device_id))
+        else:
+            result = await adb_command(f"connect {device_id}", capture_output=True)
+    # "connected to ..." 或 "already connected to ..."
+    return bool(result) and "connected" in result.lower()
+
+
+async def adb_disconnect(device_id: str) -> None:
+    """adb disconnect"""
+    ADB_COMMANDS.inc("disconnect")
+    with span("adb.disconnect", device=device_id):
+        if _use_socket():
+            await _with_server(lambda: get_adb_client().disconnect(device_id))
+        else:
+            await adb_command(f"disconnect {device_id}")
+
+
+async def adb_pull(remote_path: str, local_path: str) -> None:
+    """把裝置上的檔案拉到本機"""
+    ADB_COMMANDS.inc("pull")
+    with span("adb.pull", device=get_device_id(), path=remote_path):
+        if _use_socket():
+            data = await _with_server(lambda: get_adb_client().pull(get_device_id(), remote_path))
+            with open(local_path, "wb") as f:
+                f.write(data)
+        else:
+            await adb_command(f"pull {remote_path} {local_path}")
+
+
+async def adb_exec_out(cmd: str) -> bytes:
+    """adb exec-out：直接把指令的二進位輸出串流回來 (不經過 pty、不寫入裝置儲存空間)"""
+    ADB_COMMANDS.inc("exec_out")
+    with span("adb.exec_out", device=get_device_id(), command=cmd) as current:
+        if _use_socket():
+            stdout = await _with_server(lambda: get_adb_client().exec_out(get_device_id(), cmd))
+        else:
+            proc = await asyncio.create_subprocess_exec(
+                "adb", "-s", get_device_id(), "exec-out", cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            stdout, _ = await proc.communicate()
+        if current:
+            current.attributes["bytes"] = len(stdout)
+        return stdout
+
+
+async def screencap(png: bool = False) -> bytes:
+    """
+    截取畫面並直接讀進記憶體
+    
+    png=False 時回傳 raw framebuffer (header + RGBA)，省去電視端的 PNG 編碼。
+    """
+    with stage("screencap"):
+        return await adb_exec_out("screencap -p" if png else "screencap")
+
+
+# ==================== Shell session ====================
+_SLEEP_PATTERN = re.compile(r"\bsleep (\d+(?:\.\d+)?)")
+
+
+class AdbShellSession:
+    """
+    Long-lived shell for a single device.
+    
+    Commands are written to the shell's stdin and the output is read back
+    until a sentinel line, so each command costs one pipe write instead of
+    spawning /bin/sh and the adb client. With the socket transport the
+    shell is an `exec:sh` stream on the adb server instead of an
+    `adb shell` child process.
+    """
+    
+    def __init__(self, device_id: str):
+        self.device_id = device_id
+        self._proc: asyncio.subprocess.Process | None = None
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._lock = asyncio.Lock()
+    
+    @property
+    def alive(self) -> bool:
+        if self._writer is None or self._writer.is_closing() or self._reader.at_eof():
+            return False
+        return self._proc is None or self._proc.returncode is None
+    
+    async def _start(self) -> None:
+        if _use_socket():
+            self._reader, self._writer = await _with_server(
+                lambda: get_adb_client().open_stream(self.device_id, "exec:sh 2>&1")
+            )
+            return
+        
+        self._proc = await asyncio.create_subprocess_exec(
+            "adb", "-s", self.device_id, "shell",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        self._reader, self._writer = self._proc.stdout, self._proc.stdin
+    
+    async def close(self) -> None:
+        proc, writer = self._proc, self._writer
+        self._proc = self._reader = self._writer = None
+        if writer is not None and not writer.is_closing():
+            writer.close()
+        if proc is None or proc.returncode is not None:
+            return
+        try:
+            proc.terminate()
+            await asyncio.wait_for(proc.wait(), timeout=1)
+        except (ProcessLookupError, asyncio.TimeoutError):
+            proc.kill()
+    
+    async def _exchange(self, cmd: str) -> str:
+        sentinel = f"__TV_AGENT_{uuid.uuid4().hex}__"
+        # printf 先換行，避免指令輸出沒有結尾換行時 sentinel 黏在最後一行
+        self._writer.write(f"{cmd}\nprintf '\\n{sentinel}\\n'\n".encode())
+        await self._writer.drain()
+        
+        lines = []
+        while True:
+            line = (await self._reader.readline()).decode(errors="replace")
+            if not line:
+                raise EOFError(f"adb shell session for {self.device_id} closed")
+            if line.rstrip("\r\n") == sentinel:
+                break
+            lines.append(line)
+        # 去掉 printf 補上的換行
+        return "".join(lines)[:-1].strip()
+    
+    async def _exchange_with_timeout(self, cmd: str) -> str:
+        # 裝置端的 sleep (按鍵間隔、macro 的 wait) 不算在逾時內
+        timeout = settings.ADB_COMMAND_TIMEOUT + sum(float(s) for s in _SLEEP_PATTERN.findall(cmd))
+        return await asyncio.wait_for(self._exchange(cmd), timeout)
+    
+    async def run(self, cmd: str) -> str:
+        """Run a shell command on the device and return its output"""
+        ADB_COMMANDS.inc("shell")
+        async with self._lock:
+            with span("adb.shell", device=self.device_id, command=cmd):
+                try:
+                    if not self.alive:
+                        await self._start()
+                    try:
+                        return await self._exchange_with_timeout(cmd)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # Session 在上次指令後死掉，重新連線後再送一次
+                        await self.close()
+                        await self._start()
+                        return await self._exchange_with_timeout(cmd)
+                except TimeoutError as e:
+                    # 沒等到 sentinel (例如指令中的引號沒關好)，session 狀態不明：關掉，下次呼叫重連
+                    await self.close()
+                    _notify_failure(self.device_id, e)
+                    raise TimeoutError(f"adb shell command timed out on {self.device_id}: {cmd}") from e
+                except EOFError as e:
+                    # 指令送出後 session 才中斷，不重送以免重複按鍵；下次呼叫會自動重連
+                    print(f"ADB shell error: {e}")
+                    await self.close()
+                    _notify_failure(self.device_id, e)
+                    return ""
+                except Exception as e:
+                    _notify_failure(self.device_id, e)
+                    raise
+
+
+# 每台電視一個長駐 session，同一個 process 可以同時控制多台電視
+_sessions: dict[str, AdbShellSession] = {}
 
 
-def ensure_connection() -> bool:
+def get_shell_session(device_id: str | None = None) -> AdbShellSession:
+    """取得裝置的長駐 shell session (每台裝置一個)"""
+    device_id = device_id or get_device_id()
+    session = _sessions.get(device_id)
+    if session is None:
+        session = _sessions[device_id] = AdbShellSession(device_id)
+    return session
+
+
+async def close_shell_sessions() -> None:
+    """關閉所有 shell session"""
+    for session in _sessions.values():
+        await session.close()
+    _sessions.clear()
+
+
+# capture_shell() 期間 shell() 只收集指令，不送到電視
+_captured_commands: ContextVar[list[str] | None] = ContextVar("captured_commands", default=None)
+
+
+@contextmanager
+def capture_shell():
+    """
+    收集 shell() 的指令而不執行，用來把多個 tool 編譯成單一 script
+    
+    期間 shell() 一律回傳空字串，所以只適用於不看輸出的 tool
+    """
+    commands: list[str] = []
+    token = _captured_commands.set(commands)
+    try:
+        yield commands
+    finally:
+        _captured_commands.reset(token)
+
+
+async def shell(cmd: str) -> str:
+    """透過長駐 shell session 在電視上執行指令"""
+    captured = _captured_commands.get()
+    if captured is not None:
+        captured.append(cmd)
+        return ""
+    return await get_shell_session().run(cmd)
+
+
+def shell_session_states() -> dict[str, bool]:
+    """各裝置 shell session 是否存活"""
+    return {device_id: session.alive for device_id, session in _sessions.items()}
+
+
+async def ensure_connection(device_id: str | None = None) -> bool:
     """確保 ADB 連線，如果未連線則自動連線"""
-    devices = adb_command("devices", capture_output=True) or ""
-    if settings.DEVICE_ID in devices:
+    device_id = device_id or get_device_id()
+    devices = await adb_devices()
+    if devices.get(device_id) == "device":
         return True
     
-    # 嘗試連線
-    result = adb_command(f"connect {settings.DEVICE_ID}", capture_output=True)
-    return result and ("connected" in result.lower() or "already connected" in result.lower())
+    # 嘗試連線，重新連線後舊的 shell session 已失效
+    connected = await adb_connect(device_id)
+    await get_shell_session(device_id).close()
+    return connected
 
 
-def press_key(keycode: int) -> None:
+# ==================== Key events ====================
+async def press_key(keycode: int) -> None:
     """按下指定按鍵"""
-    adb_command(f"shell input keyevent {keycode}")
+    await shell(f"input keyevent {keycode}")
+
+
+KeySequence = list[int | tuple[int, int]]
+
+
+def build_key_script(sequence: KeySequence, interval_ms: int = 0) -> str:
+    """
+    把按鍵序列編譯成單一 shell script
+    
+    sequence 的每一項可以是 keycode，或 (keycode, delay_ms) 來覆寫該鍵之後的間隔。
+    連續沒有間隔的按鍵會合併成一次 `input keyevent k1 k2 ...`，間隔則交給裝置端的 sleep。
+    """
+    steps = [item if isinstance(item, tuple) else (item, interval_ms) for item in sequence]
+    
+    parts = []
+    batch = []
+    for i, (keycode, delay_ms) in enumerate(steps):
+        batch.append(str(keycode))
+        is_last = i == len(steps) - 1
+        if delay_ms > 0 or is_last:
+            parts.append(f"input keyevent {' '.join(batch)}")
+            batch = []
+            if delay_ms > 0 and not is_last:
+                parts.append(f"sleep {delay_ms / 1000:g}")
+    return "; ".join(parts)
+
 
+async def press_keys(sequence: KeySequence, interval_ms: int = 0) -> None:
+    """一次送出整串按鍵 (含間隔)，由裝置端控制節奏"""
+    if not sequence:
+        return
+    await shell(build_key_script(sequence, interval_ms))
 
-def enter_pin(pin: str) -> None:
+
+# ==================== Screen state ====================
+async def current_focus() -> tuple[str, str] | None:
+    """目前取得焦點的視窗 (package, activity)，無法判斷時回傳 None"""
+    result = await shell("dumpsys window | grep -E 'mCurrentFocus'")
+    match = re.search(r'([a-zA-Z0-9_.]+)/([a-zA-Z0-9_.$]+)}', result or "")
+    if match:
+        return match.group(1), match.group(2)
+    return None
+
+
+async def current_app() -> str | None:
+    """目前前景 App 在 APPS 中的名稱 (例如 "youtube")，不在清單中則回傳 package"""
+    focus = await current_focus()
+    if focus is None:
+        return None
+    package = focus[0]
+    for name, app in APPS.items():
+        if app["package"] == package:
+            return name
+    return package
+
+
+async def app_running(package: str) -> bool:
+    """package 的 process 是否已經在執行 (啟動前呼叫，用來判斷是不是冷啟動)"""
+    return bool(await shell(f"pidof {package}"))
+
+
+async def wait_for(
+    condition: Callable[[], Awaitable[bool]],
+    timeout: float | None = None,
+    interval: float | None = None,
+    min_wait: float = 0,
+) -> bool:
+    """輪詢 condition 直到成立或逾時，回傳是否成立；min_wait 秒之前不開始輪詢"""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + max(timeout or settings.READY_TIMEOUT, min_wait)
+    interval = interval or settings.READY_POLL_INTERVAL
+    with stage("wait"):
+        if min_wait:
+            with span("sleep", seconds=min_wait, reason="min_wait"):
+                await asyncio.sleep(min_wait)
+        while True:
+            if await condition():
+                return True
+            if loop.time() >= deadline:
+                return False
+            with span("sleep", seconds=interval):
+                await asyncio.sleep(interval)
+
+
+async def _wait_for_stable_focus(
+    accept: Callable[[tuple[str, str] | None], bool],
+    timeout: float | None,
+    settle: int,
+    min_wait: float = 0,
+) -> bool:
+    last = None
+    stable = 0
+    
+    async def ready() -> bool:
+        nonlocal last, stable
+        focus = await current_focus()
+        stable = stable + 1 if focus == last else 1
+        last = focus
+        return accept(focus) and stable >= settle
+    
+    return await wait_for(ready, timeout, min_wait=min_wait)
+
+
+def _cold_start_min_wait(package: str) -> float:
+    return {
+        APPS["netflix"]["package"]: settings.NETFLIX_COLD_START_MIN_WAIT,
+        APPS["youtube"]["package"]: settings.YOUTUBE_COLD_START_MIN_WAIT,
+    }.get(package, 0)
+
+
+async def wait_for_app(package: str, timeout: float | None = None, settle: int = 2, cold_start: bool = False) -> bool:
+    """
+    等到 package 取得焦點，且連續 settle 次輪詢焦點都沒變
+    
+    單一 activity 的 App 在 splash 期間就已經取得焦點，所以冷啟動 (見 app_running)
+    至少等該 App 的 *_COLD_START_MIN_WAIT 秒。
+    """
+    min_wait = _cold_start_min_wait(package) if cold_start else 0
+    return await _wait_for_stable_focus(lambda focus: focus is not None and focus[0] == package, timeout, settle, min_wait)
+
+
+async def enter_pin(pin: str) -> None:
     """輸入 PIN 碼"""
-    for digit in pin:
-        keycode = 7 + int(digit)
-        press_key(keycode)
-        time.sleep(0.2)
+    await press_keys([7 + int(digit) for digit in pin], interval_ms=200)
 
 
-def select_netflix_profile(profile_index: int, pin: str | None = None) -> str:
-    """選擇 Netflix profile 並輸入 PIN"""
-    time.sleep(3)
+async def select_netflix_profile(profile_index: int, pin: str | None = None, cold_start: bool = False) -> str:
+    """選擇 Netflix profile 並輸入 PIN (cold_start: 啟動前 Netflix 沒有在執行)"""
+    # 截圖需要 PIL，和 youtube_ocr 一樣由呼叫時才載入
+    from app.services.screen import screen_hash, wait_for_screen_change
     
-    # 移動到正確的 profile (預設焦點在第一個)
-    for _ in range(profile_index - 1):
-        press_key(KEY_CODES["down"])
-        time.sleep(0.3)
+    # 等待 Netflix 取得焦點 (冷啟動另外等 splash)
+    await wait_for_app(APPS["netflix"]["package"], cold_start=cold_start)
     
-    # 選擇 profile
-    press_key(KEY_CODES["ok"])
+    # 移動到正確的 profile (預設焦點在第一個)，然後選擇 profile
+    await press_keys([KEY_CODES["down"]] * (profile_index - 1), interval_ms=300)
+    before = await screen_hash()
+    await press_key(KEY_CODES["ok"])
     
     # 如果有 PIN，等待 PIN 輸入畫面並輸入
     if pin:
-        time.sleep(2)  # 等待 PIN 輸入畫面載入
-        enter_pin(pin)
+        with span("sleep", seconds=settings.NETFLIX_PIN_DELAY, reason="netflix_pin"):
+            await asyncio.sleep(settings.NETFLIX_PIN_DELAY)  # 等待 PIN 輸入畫面載入
+        before = await screen_hash()
+        await enter_pin(pin)
         # Netflix 會在輸入完 4 位數後自動確認，不需要按 OK
     
-    time.sleep(2)  # 等待進入首頁
+    await wait_for_screen_change(before)  # 等待進入首頁
     return f"✓ 已選擇第 {profile_index} 個 profile"
 
 
-def select_youtube_profile(profile_index: int) -> str:
+async def select_youtube_profile(profile_index: int, cold_start: bool = False) -> str:
     """
     選擇 YouTube 帳號
     
@@ -96,28 +513,18 @@ def select_youtube_profile(profile_index: int) -> str:
     3. 按 right 進入帳號區域（第一個帳號）
     4. 按 right 選擇第 N 個帳號
     """
-    time.sleep(4)  # 等待 YouTube 完全載入
-    
-    # 進入側邊欄
-    press_key(KEY_CODES["left"])
-    time.sleep(0.3)
-    
-    # 按 up 8 次確保在最上方
-    for _ in range(8):
-        press_key(KEY_CODES["up"])
-        time.sleep(0.2)
-    
-    # 按 right 進入帳號區域 (這時就是第一個帳號)
-    press_key(KEY_CODES["right"])
-    time.sleep(0.3)
+    from app.services.screen import screen_hash, wait_for_screen_change
     
-    # 選擇第 N 個帳號 (profile_index=1 不需要再按 right)
-    for _ in range(profile_index - 1):
-        press_key(KEY_CODES["right"])
-        time.sleep(0.3)
+    await wait_for_app(APPS["youtube"]["package"], cold_start=cold_start)  # 等待 YouTube 載入
     
-    # 確認選擇
-    press_key(KEY_CODES["ok"])
-    time.sleep(2)
+    await press_keys([
+        (KEY_CODES["left"], 300),            # 進入側邊欄
+        *[(KEY_CODES["up"], 200)] * 8,       # 按 up 8 次確保在最上方
+        (KEY_CODES["right"], 300),           # 進入帳號區域 (這時就是第一個帳號)
+        *[(KEY_CODES["right"], 300)] * (profile_index - 1),  # 選擇第 N 個帳號
+    ])
+    before = await screen_hash()
+    await press_key(KEY_CODES["ok"])         # 確認選擇
+    await wait_for_screen_change(before)
     
     return f"✓ 已選擇第 {profile_index} 個 YouTube 帳號"
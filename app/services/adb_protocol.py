@@ -0,0 +1,160 @@
+"""
+Pure-Python ADB host protocol client
+
+直接透過 socket 和本機 adb server (預設 5037) 溝通，不需要 fork `adb` CLI。
+支援 host:devices / host:connect / host:disconnect、shell:、exec: 以及 sync: pull。
+
+adb server 的每個 service 都會獨佔一條 socket 直到串流結束，所以這裡的
+「連線池」是限制同時開啟的串流數量；長駐的 shell session 則自己持有一條串流。
+"""
+
+import asyncio
+import struct
+
+from app.config import settings
+
+
+class AdbProtocolError(Exception):
+    """adb server 回傳 FAIL 或協定格式錯誤"""
+
+
+Stream = tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+def _encode(payload: str) -> bytes:
+    data = payload.encode()
+    return b"%04x" % len(data) + data
+
+
+async def _read_status(reader: asyncio.StreamReader) -> None:
+    status = await reader.readexactly(4)
+    if status == b"OKAY":
+        return
+    if status == b"FAIL":
+        raise AdbProtocolError(await _read_length_prefixed(reader))
+    raise AdbProtocolError(f"Unexpected adb server response: {status!r}")
+
+
+async def _read_length_prefixed(reader: asyncio.StreamReader) -> str:
+    length = int(await reader.readexactly(4), 16)
+    return (await reader.readexactly(length)).decode(errors="replace")
+
+
+async def _close(writer: asyncio.StreamWriter) -> None:
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (ConnectionError, OSError):
+        pass
+
+
+class AdbServerClient:
+    """asyncio client for the adb server's smart-socket protocol"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 5037, max_streams: int = 16):
+        self.host = host
+        self.port = port
+        self._streams = asyncio.Semaphore(max_streams)
+
+    async def _connect(self) -> Stream:
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def _request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, payload: str) -> None:
+        writer.write(_encode(payload))
+        await writer.drain()
+        await _read_status(reader)
+
+    # ==================== Host services ====================
+    async def host_command(self, service: str) -> str:
+        """執行 host: service 並回傳 server 的回應字串"""
+        async with self._streams:
+            reader, writer = await self._connect()
+            try:
+                await self._request(reader, writer, service)
+                return await _read_length_prefixed(reader)
+            finally:
+                await _close(writer)
+
+    async def devices(self) -> dict[str, str]:
+        """host:devices → {serial: state}"""
+        output = await self.host_command("host:devices")
+        devices = {}
+        for line in output.splitlines():
+            if "\t" in line:
+                serial, state = line.split("\t", 1)
+                devices[serial] = state
+        return devices
+
+    async def connect(self, serial: str) -> str:
+        return await self.host_command(f"host:connect:{serial}")
+
+    async def disconnect(self, serial: str) -> str:
+        return await self.host_command(f"host:disconnect:{serial}")
+
+    # ==================== Device services ====================
+    async def open_stream(self, serial: str, service: str) -> Stream:
+        """切換到裝置 transport 並開啟 service，回傳原始串流 (呼叫端負責關閉)"""
+        reader, writer = await self._connect()
+        try:
+            await self._request(reader, writer, f"host:transport:{serial}")
+            await self._request(reader, writer, service)
+        except BaseException:
+            await _close(writer)
+            raise
+        return reader, writer
+
+    async def _read_service(self, serial: str, service: str) -> bytes:
+        async with self._streams:
+            reader, writer = await self.open_stream(serial, service)
+            try:
+                return await reader.read()
+            finally:
+                await _close(writer)
+
+    async def shell(self, serial: str, cmd: str) -> str:
+        """shell:<cmd>，回傳文字輸出"""
+        output = await self._read_service(serial, f"shell:{cmd}")
+        return output.decode(errors="replace").strip()
+
+    async def exec_out(self, serial: str, cmd: str) -> bytes:
+        """exec:<cmd>，回傳未經處理的二進位輸出 (沒有 pty 換行轉換)"""
+        return await self._read_service(serial, f"exec:{cmd}")
+
+    async def pull(self, serial: str, remote_path: str) -> bytes:
+        """sync: RECV，把裝置上的檔案讀進記憶體"""
+        async with self._streams:
+            reader, writer = await self.open_stream(serial, "sync:")
+            try:
+                path = remote_path.encode()
+                writer.write(b"RECV" + struct.pack("<I", len(path)) + path)
+                await writer.drain()
+
+                chunks = []
+                while True:
+                    header = await reader.readexactly(8)
+                    cmd, length = header[:4], struct.unpack("<I", header[4:])[0]
+                    if cmd == b"DATA":
+                        chunks.append(await reader.readexactly(length))
+                    elif cmd == b"DONE":
+                        break
+                    elif cmd == b"FAIL":
+                        raise AdbProtocolError((await reader.readexactly(length)).decode(errors="replace"))
+                    else:
+                        raise AdbProtocolError(f"Unexpected sync response: {cmd!r}")
+
+                writer.write(b"QUIT" + struct.pack("<I", 0))
+                await writer.drain()
+                return b"".join(chunks)
+            finally:
+                await _close(writer)
+
+
+_client: AdbServerClient | None = None
+
+
+def get_adb_client() -> AdbServerClient:
+    """取得共用的 adb server client"""
+    global _client
+    if _client is None:
+        _client = AdbServerClient(settings.ADB_SERVER_HOST, settings.ADB_SERVER_PORT, settings.ADB_MAX_STREAMS)
+    return _client
@@ -2,11 +2,24 @@
 LangChain agent service
 """
 
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_openai import ChatOpenAI
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Callable
+
+import httpx
+from langchain_core.messages import AIMessageChunk, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
 
 from app.config import settings
-from app.services.tv_tools import ALL_TOOLS
+from app.services.adb import app_running, press_key, press_keys, select_netflix_profile, wait_for_app, APPS, KEY_CODES
+from app.services.command_cache import cache_tool_calls, get_cached_tool_calls
+from app.services.connection import get_connection_manager
+from app.services.intents import match_intent
+from app.services.metrics import COMMANDS, STAGE_SECONDS, TOOL_SECONDS, record_llm_usage, stage
+from app.services.scheduler import JobSuperseded, get_scheduler
+from app.services.tracing import add_span, span
+from app.services.tv_tools import ALL_TOOLS, netflix_launch, youtube_launch
 
 
 SYSTEM_PROMPT = """你是電視控制助手。根據用戶指令選擇合適的 tool 執行。
@@ -24,125 +37,373 @@ SYSTEM_PROMPT = """你是電視控制助手。根據用戶指令選擇合適的
 直接執行操作，不需要多餘解釋。"""
 
 
-def create_agent():
+# Tool schemas 只在啟動時轉換一次
+TOOL_SCHEMAS = [convert_to_openai_tool(t) for t in ALL_TOOLS]
+
+_http_client: httpx.AsyncClient | None = None
+_agent = None
+
+
+def create_agent(http_client: httpx.AsyncClient | None = None):
     """Create LangChain agent with tools"""
+    # langchain_openai (連同 openai SDK) import 要 1 秒以上，放到建立 agent 時才載入
+    from langchain_openai import ChatOpenAI
+    
     llm = ChatOpenAI(
         base_url=settings.LITELLM_BASE_URL,
         api_key=settings.LITELLM_API_KEY or "dummy",
         model=settings.LITELLM_MODEL,
+        timeout=settings.LLM_TIMEOUT,
+        max_retries=settings.LLM_MAX_RETRIES,
+        http_async_client=http_client,
+        stream_usage=True,
+    )
+    return llm.bind_tools(TOOL_SCHEMAS)
+
+
+async def init_agent():
+    """Create the process-wide agent and warm up its connection pool"""
+    global _http_client, _agent
+    _http_client = httpx.AsyncClient(
+        http2=settings.LLM_HTTP2,
+        timeout=httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+        ),
     )
-    return llm.bind_tools(ALL_TOOLS)
+    _agent = create_agent(_http_client)
+    
+    # 預先建立 TCP/TLS 連線，讓第一個指令不用付握手成本
+    await _http_client.get(
+        f"{settings.LITELLM_BASE_URL.rstrip('/')}/models",
+        headers={"Authorization": f"Bearer {settings.LITELLM_API_KEY or 'dummy'}"},
+    )
+
+
+async def close_agent():
+    """Close the shared HTTP connection pool"""
+    global _http_client, _agent
+    if _http_client:
+        await _http_client.aclose()
+    _http_client = None
+    _agent = None
+
+
+def get_agent():
+    """Get the shared agent (created on demand if lifespan has not run)"""
+    global _agent
+    if _agent is None:
+        _agent = create_agent(_http_client)
+    return _agent
+
 
+EventCallback = Callable[[str, dict], None]
 
-async def process_command(text: str, user_profile: dict | None = None) -> tuple[str, list[dict]]:
+
+def _emit(on_event: EventCallback | None, event: str, data: dict) -> None:
+    if on_event is not None:
+        on_event(event, data)
+
+
+async def execute_tool_call(tc: dict, user_profile: dict | None = None) -> dict | None:
     """
-    Process a natural language command
+    Execute a single tool call
     
     Returns:
-        tuple of (message, tool_results)
+        tool_result dict, or None if the tool is unknown
     """
-    from app.services.adb import select_netflix_profile, select_youtube_profile, ensure_connection
-    from app.services.tv_tools import netflix_launch, youtube_launch
+    tool_name = tc["name"]
+    tool_args = tc["args"]
     
-    # 確保 ADB 連線
-    ensure_connection()
+    # Special handling for netflix_launch with user profile
+    if tool_name == "netflix_launch" and user_profile:
+        cold_start = not await app_running(APPS["netflix"]["package"])
+        await netflix_launch.ainvoke({})
+        profile_result = await select_netflix_profile(
+            user_profile["netflix_profile_index"],
+            user_profile.get("netflix_pin"),
+            cold_start=cold_start,
+        )
+        return {
+            "tool": tool_name,
+            "args": tool_args,
+            "result": f"✓ 已啟動 Netflix 並 {profile_result}"
+        }
     
-    agent = create_agent()
+    # Special handling for youtube_launch with user profile
+    if tool_name == "youtube_launch" and user_profile and user_profile.get("youtube_account_name"):
+        # OCR 模組很重，由啟動預熱載入 (見 warmup)
+        from app.services.screen import screen_hash, wait_for_screen_change
+        from app.services.youtube_ocr import detect_and_find_youtube_account
+        
+        # Launch YouTube first
+        cold_start = not await app_running(APPS["youtube"]["package"])
+        await youtube_launch.ainvoke({})
+        
+        # Wait until YouTube has focus (cold starts also wait out the splash screen)
+        await wait_for_app(APPS["youtube"]["package"], cold_start=cold_start)
+        
+        # Navigate to account selection area (left sidebar, then up to top),
+        # then press right to enter account selection - this should show "誰在觀看" screen
+        await press_keys([(KEY_CODES["left"], 500), *[(KEY_CODES["up"], 200)] * 8, KEY_CODES["right"]])
+        
+        # Detection waits until the account names are on screen and stable
+        target_name = user_profile["youtube_account_name"]
+        position, detected = await detect_and_find_youtube_account(target_name)
+        
+        if position:
+            # We're currently on the first account (after pressing right)
+            # Need to move right (position - 1) times to reach target
+            await press_keys([KEY_CODES["right"]] * (position - 1), interval_ms=300)
+            before = await screen_hash()
+            await press_key(KEY_CODES["ok"])
+            await wait_for_screen_change(before)  # 等到離開「誰在觀看」畫面
+            result_msg = f"✓ 已啟動 YouTube 並選擇帳號 {target_name} (位置 {position}, 偵測到: {detected})"
+        else:
+            # If not found, just press ok on current account
+            await press_key(KEY_CODES["ok"])
+            result_msg = f"✗ 找不到帳號 {target_name}。偵測到: {detected}"
+        
+        return {
+            "tool": tool_name,
+            "args": tool_args,
+            "result": result_msg
+        }
     
-    # Modify system prompt if user has profile
-    system_content = SYSTEM_PROMPT
-    if user_profile:
-        system_content += f"\n\n用戶的設定: Netflix 第 {user_profile['netflix_profile_index']} 個, YouTube 第 {user_profile.get('youtube_profile_index', 1)} 個"
+    # Normal tool execution
+    for t in ALL_TOOLS:
+        if t.name == tool_name:
+            result = await t.ainvoke(tool_args)
+            return {
+                "tool": tool_name,
+                "args": tool_args,
+                "result": result
+            }
+    return None
+
+
+async def _aiter(tool_calls: list[dict]) -> AsyncIterator[dict]:
+    for tc in tool_calls:
+        yield tc
+
+
+async def execute_tool_calls(
+    tool_calls: list[dict] | AsyncIterator[dict],
+    user_profile: dict | None = None,
+    on_event: EventCallback | None = None,
+) -> list[dict]:
+    """
+    Execute the tool calls decided for one command
     
-    messages = [
-        SystemMessage(content=system_content),
-        HumanMessage(content=text)
-    ]
+    tool_calls may be an async iterator of tool calls still being streamed
+    from the LLM; each one runs as soon as it arrives.
+    
+    Returns:
+        list of tool_results
+    """
+    if isinstance(tool_calls, list):
+        tool_calls = _aiter(tool_calls)
     
-    response = agent.invoke(messages)
     tool_results = []
+    async for tc in tool_calls:
+        _emit(on_event, "tool_started", {"tool": tc["name"], "args": tc["args"]})
+        with TOOL_SECONDS.time(tc["name"]), span("tool", tool=tc["name"], args=tc["args"]):
+            tool_result = await execute_tool_call(tc, user_profile)
+        if tool_result is not None:
+            tool_results.append(tool_result)
+            _emit(on_event, "tool_finished", tool_result)
+    return tool_results
+
+
+def _parse_args(args: str | None) -> dict | None:
+    """完整的 JSON object 才算解析完成 (最後的 `}` 只會在參數結束時出現)"""
+    try:
+        value = json.loads(args) if args else None
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+async def _stream_llm(messages: list[BaseMessage], queue: asyncio.Queue) -> AIMessageChunk | None:
+    """
+    Stream the LLM response and put every tool call on the queue as soon as its
+    arguments are complete.
     
-    if response.tool_calls:
-        for tc in response.tool_calls:
-            tool_name = tc["name"]
-            tool_args = tc["args"]
-            
-            # Special handling for netflix_launch with user profile
-            if tool_name == "netflix_launch" and user_profile:
-                netflix_launch.invoke({})
-                profile_result = select_netflix_profile(
-                    user_profile["netflix_profile_index"],
-                    user_profile.get("netflix_pin")
-                )
-                tool_results.append({
-                    "tool": tool_name,
-                    "args": tool_args,
-                    "result": f"✓ 已啟動 Netflix 並 {profile_result}"
-                })
-                continue
-            
-            # Special handling for youtube_launch with user profile
-            if tool_name == "youtube_launch" and user_profile and user_profile.get("youtube_account_name"):
-                from app.services.youtube_ocr import detect_and_find_youtube_account
-                from app.services.adb import press_key, KEY_CODES
-                import time
-                
-                # Launch YouTube first
-                youtube_launch.invoke({})
-                
-                # Wait for account selection screen to load
-                time.sleep(5)
-                
-                # Navigate to account selection area (left sidebar, then up to top)
-                press_key(KEY_CODES["left"])
-                time.sleep(0.5)
-                for _ in range(8):
-                    press_key(KEY_CODES["up"])
-                    time.sleep(0.2)
-                
-                # Press right to enter account selection - this should show "誰在觀看" screen
-                press_key(KEY_CODES["right"])
-                time.sleep(2)  # Wait for account selection screen to fully load
-                
-                # NOW take screenshot and detect accounts
-                target_name = user_profile["youtube_account_name"]
-                position, detected = detect_and_find_youtube_account(target_name)
-                
-                if position:
-                    # We're currently on the first account (after pressing right)
-                    # Need to move right (position - 1) times to reach target
-                    for _ in range(position - 1):
-                        press_key(KEY_CODES["right"])
-                        time.sleep(0.3)
-                    press_key(KEY_CODES["ok"])
-                    time.sleep(2)
-                    result_msg = f"✓ 已啟動 YouTube 並選擇帳號 {target_name} (位置 {position}, 偵測到: {detected})"
-                else:
-                    # If not found, just press ok on current account
-                    press_key(KEY_CODES["ok"])
-                    result_msg = f"✗ 找不到帳號 {target_name}。偵測到: {detected}"
-                
-                tool_results.append({
-                    "tool": tool_name,
-                    "args": tool_args,
-                    "result": result_msg
-                })
-                continue
-            
-            # Normal tool execution
-            for t in ALL_TOOLS:
-                if t.name == tool_name:
-                    result = t.invoke(tool_args)
-                    tool_results.append({
-                        "tool": tool_name,
-                        "args": tool_args,
-                        "result": result
-                    })
+    Tool calls are released in order. The queue ends with None, or with the
+    exception if streaming failed.
+    
+    Returns:
+        the merged response
+    """
+    response = None
+    released = 0
+    start = time.perf_counter()
+    first_tool_call = None
+    try:
+        async for chunk in get_agent().astream(messages):
+            response = chunk if response is None else response + chunk
+            while released < len(response.tool_call_chunks):
+                tc = response.tool_call_chunks[released]
+                args = _parse_args(tc["args"])
+                if not tc["name"] or args is None:
                     break
+                if released == 0:
+                    first_tool_call = time.perf_counter()
+                    STAGE_SECONDS.observe("llm_first_tool_call", first_tool_call - start)
+                queue.put_nowait({"name": tc["name"], "args": args, "id": tc["id"], "type": "tool_call"})
+                released += 1
+        
+        # 串流結束：沒有參數的 tool call 也算完成，無法解析的略過
+        if response is not None:
+            for tc in response.tool_call_chunks[released:]:
+                args = _parse_args(tc["args"] or "{}")
+                if tc["name"] and args is not None:
+                    queue.put_nowait({"name": tc["name"], "args": args, "id": tc["id"], "type": "tool_call"})
+    except Exception as e:
+        queue.put_nowait(e)
+        raise
+    finally:
+        end = time.perf_counter()
+        STAGE_SECONDS.observe("llm", end - start)
+        add_span(
+            "llm", start, end,
+            model=settings.LITELLM_MODEL,
+            streaming=True,
+            first_tool_call_ms=round((first_tool_call - start) * 1000, 3) if first_tool_call else None,
+        )
+    record_llm_usage(response)
+    queue.put_nowait(None)
+    return response
+
+
+async def _drain(queue: asyncio.Queue, on_event: EventCallback | None) -> AsyncIterator[dict]:
+    while (item := await queue.get()) is not None:
+        if isinstance(item, Exception):
+            raise item
+        _emit(on_event, "tool_call_decided", {"tool": item["name"], "args": item["args"], "source": "llm"})
+        yield item
+
+
+async def _run_streaming(
+    messages: list[BaseMessage],
+    device_id: str,
+    user_profile: dict | None,
+    on_event: EventCallback | None,
+) -> tuple[str, list[dict], list[dict]]:
+    """
+    Execute tool calls while the LLM is still generating.
+    
+    The job is queued on the device scheduler as soon as the first tool call
+    is complete, so a tool such as youtube_launch overlaps with the rest of
+    the generation. A text-only response never touches the scheduler.
+    
+    Returns:
+        tuple of (content, tool_calls, tool_results)
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    llm_task = asyncio.create_task(_stream_llm(messages, queue))
+    try:
+        tool_calls = _drain(queue, on_event)
+        first = await anext(tool_calls, None)
+        tool_results = []
+        if first is not None:
+            tool_results = await get_scheduler(device_id).submit_stream(
+                first,
+                tool_calls,
+                lambda tool_calls: execute_tool_calls(tool_calls, user_profile, on_event),
+            )
+        response = await llm_task
+    finally:
+        llm_task.cancel()
+        # LLM 的錯誤已經透過 queue 拋出
+        await asyncio.gather(llm_task, return_exceptions=True)
+    
+    if response is None:
+        return "", [], tool_results
+    return response.content, response.tool_calls, tool_results
+
+
+async def process_command(
+    text: str,
+    user_profile: dict | None = None,
+    device_id: str | None = None,
+    on_event: EventCallback | None = None,
+) -> tuple[str, list[dict]]:
+    """
+    Process a natural language command
+    
+    on_event(event, data) receives progress events: llm_started,
+    tool_call_decided, tool_started and tool_finished.
+    
+    Returns:
+        tuple of (message, tool_results)
+    """
+    # 確保 ADB 連線 (讀取快取的連線狀態，實際檢查由背景 heartbeat 負責)
+    device_id = device_id or settings.DEVICE_ID
+    with stage("connection"):
+        await get_connection_manager(device_id).ensure()
+    
+    # 常見指令直接由規則對應，不經過 LLM
+    content = ""
+    tool_results = None
+    source = "intent"
+    with stage("intent"):
+        tool_calls = await match_intent(text, device_id)
+    if tool_calls is None:
+        # 重複的指令直接使用快取的 tool_calls
+        source = "cache"
+        with stage("cache"):
+            tool_calls = await get_cached_tool_calls(text, user_profile)
+    if tool_calls is None:
+        source = "llm"
+        _emit(on_event, "llm_started", {"model": settings.LITELLM_MODEL})
+        agent = get_agent()
+        
+        # Modify system prompt if user has profile
+        system_content = SYSTEM_PROMPT
+        if user_profile:
+            system_content += f"\n\n用戶的設定: Netflix 第 {user_profile['netflix_profile_index']} 個, YouTube 第 {user_profile.get('youtube_profile_index', 1)} 個"
+        
+        messages = [
+            SystemMessage(content=system_content),
+            HumanMessage(content=text)
+        ]
+        
+        if settings.LLM_STREAM_TOOL_CALLS:
+            # 邊 streaming 邊執行已經解析完成的 tool call
+            try:
+                content, tool_calls, tool_results = await _run_streaming(messages, device_id, user_profile, on_event)
+            except JobSuperseded as e:
+                return f"✗ {e}", []
+        else:
+            with stage("llm", model=settings.LITELLM_MODEL):
+                response = await agent.ainvoke(messages)
+            record_llm_usage(response)
+            tool_calls = response.tool_calls
+            content = response.content
+        await cache_tool_calls(text, user_profile, tool_calls)
+    
+    COMMANDS.inc(source)
+    
+    if tool_results is None:
+        for tc in tool_calls:
+            _emit(on_event, "tool_call_decided", {"tool": tc["name"], "args": tc["args"], "source": source})
+        
+        tool_results = []
+        if tool_calls:
+            # 同一個請求的 tool calls 在裝置排程器上以單一 job 執行，避免和其他請求的按鍵交錯
+            try:
+                tool_results = await get_scheduler(device_id).submit(
+                    tool_calls,
+                    lambda tool_calls: execute_tool_calls(tool_calls, user_profile, on_event),
+                )
+            except JobSuperseded as e:
+                return f"✗ {e}", []
     
     if tool_results:
         message = " | ".join([r["result"] for r in tool_results])
     else:
-        message = response.content or "沒有執行任何操作"
+        message = content or "沒有執行任何操作"
     
     return message, tool_results
@@ -0,0 +1,121 @@
+"""
+Command → tool-call cache
+
+同一句指令 (正規化後) 配上相同的使用者設定時，LLM 的 tool_calls 幾乎不會變，
+所以直接快取起來跳過模型。記憶體中是 LRU + TTL；COMMAND_CACHE_PERSIST 開啟時
+另外寫入 Postgres 的 command_cache 表，重啟後仍可命中。
+"""
+
+import json
+import time
+import uuid
+from collections import OrderedDict
+
+from app.config import settings
+from app.services.database import get_pool
+from app.services.intents import normalize_text
+
+
+_entries: OrderedDict[str, tuple[float, list[dict]]] = OrderedDict()
+_stats = {"hits": 0, "db_hits": 0, "misses": 0, "evictions": 0}
+
+
+def cache_key(text: str, user_profile: dict | None = None) -> str:
+    """正規化文字 + 會影響 LLM 回應的設定 (模型與 system prompt 中的 profile 欄位)"""
+    parts = [settings.LITELLM_MODEL, normalize_text(text)]
+    if user_profile:
+        parts.append(str(user_profile.get("netflix_profile_index")))
+        parts.append(str(user_profile.get("youtube_profile_index", 1)))
+    return "|".join(parts)
+
+
+def _with_ids(tool_calls: list[dict]) -> list[dict]:
+    return [
+        {"name": tc["name"], "args": dict(tc["args"]), "id": f"cache_{uuid.uuid4().hex[:12]}", "type": "tool_call"}
+        for tc in tool_calls
+    ]
+
+
+def _remember(key: str, tool_calls: list[dict], created_at: float) -> None:
+    _entries[key] = (created_at, tool_calls)
+    _entries.move_to_end(key)
+    while len(_entries) > settings.COMMAND_CACHE_SIZE:
+        _entries.popitem(last=False)
+        _stats["evictions"] += 1
+
+
+async def get_cached_tool_calls(text: str, user_profile: dict | None = None) -> list[dict] | None:
+    """查詢快取，命中時回傳可直接執行的 tool_calls"""
+    key = cache_key(text, user_profile)
+    now = time.time()
+
+    entry = _entries.get(key)
+    if entry is not None:
+        created_at, tool_calls = entry
+        if now - created_at < settings.COMMAND_CACHE_TTL:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return _with_ids(tool_calls)
+        del _entries[key]
+
+    pool = get_pool()
+    if settings.COMMAND_CACHE_PERSIST and pool:
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                SELECT tool_calls, EXTRACT(EPOCH FROM NOW() - created_at) AS age FROM command_cache
+                WHERE cache_key = $1 AND created_at > NOW() - make_interval(secs => $2)
+                """,
+                key, settings.COMMAND_CACHE_TTL
+            )
+        if row:
+            tool_calls = json.loads(row["tool_calls"])
+            # 年齡在 SQL 中計算：舊的 TIMESTAMP 欄位沒有時區，直接換成 epoch 會差一個時區的秒數
+            _remember(key, tool_calls, time.time() - float(row["age"]))
+            _stats["db_hits"] += 1
+            return _with_ids(tool_calls)
+
+    _stats["misses"] += 1
+    return None
+
+
+async def cache_tool_calls(text: str, user_profile: dict | None, tool_calls: list[dict]) -> None:
+    """把 LLM 決定的 tool_calls 存入快取"""
+    if not tool_calls:
+        return
+    key = cache_key(text, user_profile)
+    stored = [{"name": tc["name"], "args": dict(tc["args"])} for tc in tool_calls]
+    _remember(key, stored, time.time())
+
+    pool = get_pool()
+    if settings.COMMAND_CACHE_PERSIST and pool:
+        async with pool.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO command_cache (cache_key, tool_calls) VALUES ($1, $2::jsonb)
+                ON CONFLICT (cache_key) DO UPDATE SET tool_calls = EXCLUDED.tool_calls, created_at = NOW()
+                """,
+                key, json.dumps(stored, ensure_ascii=False)
+            )
+
+
+async def clear_cache() -> None:
+    """清空快取 (包含 Postgres)"""
+    _entries.clear()
+    pool = get_pool()
+    if settings.COMMAND_CACHE_PERSIST and pool:
+        async with pool.acquire() as conn:
+            await conn.execute("DELETE FROM command_cache")
+
+
+def cache_stats() -> dict:
+    """命中率統計"""
+    lookups = _stats["hits"] + _stats["db_hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "size": len(_entries),
+        "max_size": settings.COMMAND_CACHE_SIZE,
+        "ttl": settings.COMMAND_CACHE_TTL,
+        "persistent": settings.COMMAND_CACHE_PERSIST,
+        "hit_rate": (_stats["hits"] + _stats["db_hits"]) / lookups if lookups else 0.0,
+    }
@@ -0,0 +1,124 @@
+"""
+ADB connection state manager
+
+請求路徑只讀記憶體中的連線狀態；實際的 `adb devices` / `adb connect` 由背景
+heartbeat 執行，斷線時以 exponential backoff 重連。ADB 指令失敗時會讓快取失效，
+下一個請求就會重新檢查。
+"""
+
+import asyncio
+import time
+
+from app.config import settings
+from app.services.adb import add_failure_listener, ensure_connection
+
+
+class ConnectionManager:
+    """Cached connection state and heartbeat for one device"""
+
+    def __init__(self, device_id: str):
+        self.device_id = device_id
+        self.connected = False
+        self.checked_at = 0.0
+        self.failures = 0
+        self.next_retry_at = 0.0
+        self._lock = asyncio.Lock()
+        self._heartbeat: asyncio.Task | None = None
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.monotonic() - self.checked_at < settings.ADB_CONNECTION_TTL
+
+    @property
+    def backoff(self) -> float:
+        """目前的重連間隔 (秒)"""
+        if self.failures == 0:
+            return 0
+        return min(2 ** (self.failures - 1), settings.ADB_RECONNECT_MAX_BACKOFF)
+
+    def invalidate(self) -> None:
+        """讓快取失效，下一次 ensure() 會重新檢查"""
+        self.checked_at = 0.0
+
+    async def check(self) -> bool:
+        """實際檢查 (必要時重連) 並更新狀態"""
+        async with self._lock:
+            # 等鎖期間其他人已經檢查過了
+            if self.is_fresh:
+                return self.connected
+            try:
+                self.connected = bool(await ensure_connection(self.device_id))
+            except Exception as e:
+                print(f"ADB connection check failed for {self.device_id}: {e}")
+                self.connected = False
+
+            now = time.monotonic()
+            self.checked_at = now
+            if self.connected:
+                self.failures = 0
+                self.next_retry_at = 0.0
+            else:
+                self.failures += 1
+                self.next_retry_at = now + self.backoff
+            return self.connected
+
+    async def ensure(self) -> bool:
+        """請求路徑用：快取有效就直接回傳，不碰裝置"""
+        if self.is_fresh:
+            return self.connected
+        if not self.connected and time.monotonic() < self.next_retry_at:
+            # 還在 backoff 中，交給 heartbeat 重連
+            return False
+        return await self.check()
+
+    async def _run_heartbeat(self) -> None:
+        while True:
+            # 第一次若啟動預熱剛檢查過就直接沿用
+            await self.check()
+            interval = settings.ADB_HEARTBEAT_INTERVAL if self.connected else self.backoff
+            await asyncio.sleep(interval)
+            self.invalidate()
+
+    def start(self) -> None:
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._run_heartbeat())
+
+    async def stop(self) -> None:
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat = None
+
+
+_managers: dict[str, ConnectionManager] = {}
+
+
+def get_connection_manager(device_id: str | None = None) -> ConnectionManager:
+    """取得裝置的連線狀態 (每台裝置一個)"""
+    device_id = device_id or settings.DEVICE_ID
+    manager = _managers.get(device_id)
+    if manager is None:
+        manager = _managers[device_id] = ConnectionManager(device_id)
+    return manager
+
+
+def _on_adb_failure(device_id: str, error: BaseException) -> None:
+    get_connection_manager(device_id).invalidate()
+
+
+add_failure_listener(_on_adb_failure)
+
+
+def start_heartbeats() -> None:
+    """為所有已註冊的電視啟動背景 heartbeat"""
+    for device_id in settings.DEVICES.values():
+        get_connection_manager(device_id).start()
+
+
+async def stop_heartbeats() -> None:
+    """停止所有 heartbeat"""
+    for manager in _managers.values():
+        await manager.stop()
@@ -2,11 +2,21 @@
 Database service using asyncpg
 """
 
+import time
+from collections import OrderedDict
+
 import asyncpg
 from app.config import settings
 
 db_pool: asyncpg.Pool | None = None
 
+# profile 很少變動，查過的結果 (包含查無資料) 放在記憶體，寫入時失效
+PROFILE_CHANNEL = "user_profile_changed"
+_profile_cache: OrderedDict[str, tuple[float, dict | None]] = OrderedDict()
+# 每次失效加一；查詢期間有失效時不寫入快取，避免把寫入前讀到的舊資料放回去
+_profile_generation = 0
+_listener: asyncpg.Connection | None = None
+
 
 def get_pool() -> asyncpg.Pool | None:
     """Get the current database pool"""
@@ -30,25 +40,146 @@ async def init_db():
                 updated_at TIMESTAMP DEFAULT NOW()
             )
         """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS macros (
+                name VARCHAR(100) PRIMARY KEY,
+                description TEXT,
+                steps JSONB NOT NULL,
+                created_at TIMESTAMP DEFAULT NOW(),
+                updated_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS youtube_account_layouts (
+                device_id VARCHAR(100) PRIMARY KEY,
+                account_names TEXT[] NOT NULL,
+                band_hash TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS youtube_account_templates (
+                account_name VARCHAR(100) PRIMARY KEY,
+                width INT NOT NULL,
+                height INT NOT NULL,
+                pixels BYTEA NOT NULL,
+                updated_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS command_cache (
+                cache_key TEXT PRIMARY KEY,
+                tool_calls JSONB NOT NULL,
+                created_at TIMESTAMPTZ DEFAULT NOW()
+            )
+        """)
+    
+    if settings.PROFILE_CACHE_NOTIFY:
+        await _start_profile_listener()
 
 
 async def close_db():
     """Close database pool"""
-    global db_pool
+    global db_pool, _listener
+    if _listener:
+        await _listener.close()
+        _listener = None
     if db_pool:
         await db_pool.close()
 
 
+def _drop_profiles(user_id: str | None) -> None:
+    global _profile_generation
+    _profile_generation += 1
+    if user_id:
+        _profile_cache.pop(user_id, None)
+    else:
+        _profile_cache.clear()
+
+
+def _on_profile_notify(conn, pid, channel, payload: str) -> None:
+    # payload 是 user_id；空字串代表全部失效
+    _drop_profiles(payload)
+
+
+async def _start_profile_listener() -> None:
+    """LISTEN 用的專屬連線 (pool 裡的連線會被歸還，不能拿來 LISTEN)"""
+    global _listener
+    try:
+        _listener = await asyncpg.connect(settings.DATABASE_URL)
+        await _listener.add_listener(PROFILE_CHANNEL, _on_profile_notify)
+    except Exception as e:
+        print(f"Profile cache LISTEN error: {e}")
+        _listener = None
+
+
 async def get_user_profile(user_id: str) -> dict | None:
-    """Get user profile from database"""
+    """Get user profile (cached in memory for PROFILE_CACHE_TTL seconds)"""
+    entry = _profile_cache.get(user_id)
+    if entry is not None:
+        cached_at, profile = entry
+        if time.monotonic() - cached_at < settings.PROFILE_CACHE_TTL:
+            _profile_cache.move_to_end(user_id)
+            return dict(profile) if profile else None
+        del _profile_cache[user_id]
+    
     pool = get_pool()
     if not pool:
         return None
+    generation = _profile_generation
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
             "SELECT * FROM user_profiles WHERE user_id = $1", user_id
         )
+    profile = dict(row) if row else None
+    
+    if generation == _profile_generation:
+        _profile_cache[user_id] = (time.monotonic(), profile)
+        while len(_profile_cache) > settings.PROFILE_CACHE_SIZE:
+            _profile_cache.popitem(last=False)
+    return dict(profile) if profile else None
+
+
+async def invalidate_user_profile(user_id: str | None = None) -> None:
+    """
+    Drop a cached profile after a write (all profiles when user_id is None).
+    
+    Other processes are notified through Postgres NOTIFY.
+    """
+    _drop_profiles(user_id)
+    
+    pool = get_pool()
+    if settings.PROFILE_CACHE_NOTIFY and pool:
+        async with pool.acquire() as conn:
+            await conn.execute("SELECT pg_notify($1, $2)", PROFILE_CHANNEL, user_id or "")
+
+
+async def get_youtube_account_layout(device_id: str) -> dict | None:
+    """Get the learned YouTube account order for a TV"""
+    pool = get_pool()
+    if not pool:
+        return None
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            "SELECT account_names, band_hash FROM youtube_account_layouts WHERE device_id = $1", device_id
+        )
         if row:
-            return dict(row)
+            return {"account_names": list(row["account_names"]), "band_hash": row["band_hash"]}
     return None
 
+
+async def save_youtube_account_layout(device_id: str, account_names: list[str], band_hash: str) -> None:
+    """Save the learned YouTube account order for a TV"""
+    pool = get_pool()
+    if not pool:
+        return
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            INSERT INTO youtube_account_layouts (device_id, account_names, band_hash)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (device_id) DO UPDATE
+            SET account_names = EXCLUDED.account_names, band_hash = EXCLUDED.band_hash, updated_at = NOW()
+            """,
+            device_id, account_names, band_hash
+        )
@@ -0,0 +1,175 @@
+"""
+Rule-based intent matcher
+
+常見的固定指令 ("暫停"、"音量增加"、"回首頁"、"倒退10秒"...) 直接用規則對應到
+tool calls，不需要經過 LLM。規則是資料 (INTENT_RULES，或由 INTENT_RULES_FILE
+指定的 JSON 檔)，沒有規則符合時才交給 LLM。
+"""
+
+import json
+import re
+import unicodedata
+import uuid
+
+from app.config import settings
+from app.services.adb import current_app, current_device
+
+
+NUM = r"[0-9零一二兩三四五六七八九十百]+"
+
+# 每條規則: name, pattern (對正規化後的文字做 fullmatch), tool, args (固定參數)
+# slots: 具名群組 → 型別 (number / direction / app)，沒抓到的 slot 使用 tool 預設值
+# resolve: 沒抓到時改由裝置狀態決定的參數 (目前只支援 current_app)
+INTENT_RULES = [
+    {"name": "play_pause", "pattern": r"暫停|播放|繼續播放|繼續|pause|play", "tool": "play_pause"},
+    {"name": "stop", "pattern": r"停止|停止播放|stop", "tool": "stop_playback"},
+    {
+        "name": "volume_up",
+        "pattern": rf"(?:(?:音量|聲音)(?:增加|調高|調大|加大|提高)|大聲)(?:一點)?(?P<steps>{NUM})?(?:格|點)?",
+        "tool": "tv_volume", "args": {"action": "up"}, "slots": {"steps": "number"},
+    },
+    {
+        "name": "volume_down",
+        "pattern": rf"(?:(?:音量|聲音)(?:降低|調低|調小|減少|減小)|小聲)(?:一點)?(?P<steps>{NUM})?(?:格|點)?",
+        "tool": "tv_volume", "args": {"action": "down"}, "slots": {"steps": "number"},
+    },
+    {"name": "mute", "pattern": r"靜音|取消靜音|mute", "tool": "tv_volume", "args": {"action": "mute"}},
+    {"name": "home", "pattern": r"(?:回到?|返回)?首頁|home", "tool": "tv_remote", "args": {"key": "home"}},
+    {"name": "back", "pattern": r"返回|上一頁|back", "tool": "tv_remote", "args": {"key": "back"}},
+    {"name": "ok", "pattern": r"確認|確定|ok", "tool": "tv_remote", "args": {"key": "ok"}},
+    {
+        "name": "navigate",
+        "pattern": rf"[往向]?(?P<direction>[上下左右])(?:移動?)?(?P<steps>{NUM})?[步格]?",
+        "tool": "tv_navigate", "slots": {"direction": "direction", "steps": "number"},
+    },
+    {
+        "name": "rewind",
+        "pattern": rf"(?P<app>youtube|netflix)?(?:倒退|倒轉|後退)(?P<seconds>{NUM})?秒?",
+        "tool": "rewind", "slots": {"app": "app", "seconds": "number"}, "resolve": {"app": "current_app"},
+    },
+    {
+        "name": "fast_forward",
+        "pattern": rf"(?P<app>youtube|netflix)?(?:快轉|快進)(?P<seconds>{NUM})?秒?",
+        "tool": "fast_forward", "slots": {"app": "app", "seconds": "number"}, "resolve": {"app": "current_app"},
+    },
+    {"name": "youtube_launch", "pattern": r"(?:打開|開啟|啟動|開)youtube", "tool": "youtube_launch"},
+    {"name": "youtube_close", "pattern": r"(?:關閉|關掉)youtube", "tool": "youtube_close"},
+    {"name": "netflix_launch", "pattern": r"(?:打開|開啟|啟動|開)netflix", "tool": "netflix_launch"},
+    {"name": "netflix_close", "pattern": r"(?:關閉|關掉)netflix", "tool": "netflix_close"},
+    {"name": "power_off", "pattern": r"關機|關電視|關閉電視", "tool": "tv_power", "args": {"action": "off"}},
+    {"name": "power_on", "pattern": r"開機|開電視|打開電視", "tool": "tv_power", "args": {"action": "on"}},
+    {
+        "name": "input_source",
+        "pattern": r"(?:切換到?|切到)?hdmi(?P<hdmi>[1-4一二三四])",
+        "tool": "tv_input_source", "slots": {"hdmi": "number"},
+    },
+]
+
+DIRECTIONS = {"上": "up", "下": "down", "左": "left", "右": "right"}
+CHINESE_DIGITS = {"零": 0, "一": 1, "二": 2, "兩": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+
+def _parse_number(text: str) -> int:
+    """阿拉伯數字或簡單中文數字 (一 ~ 九百九十九)"""
+    if text.isdigit():
+        return int(text)
+    total, digit = 0, 0
+    for char in text:
+        if char in CHINESE_DIGITS:
+            digit = CHINESE_DIGITS[char]
+        elif char == "十":
+            total += (digit or 1) * 10
+            digit = 0
+        elif char == "百":
+            total += (digit or 1) * 100
+            digit = 0
+    return total + digit
+
+
+SLOT_TYPES = {
+    "number": _parse_number,
+    "direction": DIRECTIONS.get,
+    "app": str,
+}
+
+
+def normalize_text(text: str) -> str:
+    """全形轉半形、小寫、去掉空白與標點"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(
+        char for char in text
+        if not char.isspace() and not unicodedata.category(char).startswith("P")
+    )
+
+
+def _load_rules() -> list[dict]:
+    rules = INTENT_RULES
+    if settings.INTENT_RULES_FILE:
+        with open(settings.INTENT_RULES_FILE, encoding="utf-8") as f:
+            rules = json.load(f)
+    return [{**rule, "regex": re.compile(rule["pattern"])} for rule in rules]
+
+
+_rules = _load_rules()
+_stats = {"total": 0, "hits": 0, "by_rule": {}}
+
+
+async def _resolve(source: str, device_id: str | None) -> str | None:
+    if source == "current_app":
+        token = current_device.set(device_id)
+        try:
+            app = await current_app()
+        except Exception:
+            app = None
+        finally:
+            current_device.reset(token)
+        return app if app in ("youtube", "netflix") else None
+    return None
+
+
+async def match_intent(text: str, device_id: str | None = None) -> list[dict] | None:
+    """
+    Match a command against the intent rules
+
+    Returns:
+        tool_calls in the same structure as the LLM response, or None if no rule matched
+    """
+    _stats["total"] += 1
+    normalized = normalize_text(text)
+
+    for rule in _rules:
+        match = rule["regex"].fullmatch(normalized)
+        if not match:
+            continue
+
+        args = dict(rule.get("args", {}))
+        for slot, slot_type in rule.get("slots", {}).items():
+            value = match.group(slot)
+            if value is not None:
+                args[slot] = SLOT_TYPES[slot_type](value)
+
+        for slot, source in rule.get("resolve", {}).items():
+            if slot not in args:
+                value = await _resolve(source, device_id)
+                if value is None:
+                    # 無法決定參數，交給 LLM
+                    return None
+                args[slot] = value
+
+        _stats["hits"] += 1
+        _stats["by_rule"][rule["name"]] = _stats["by_rule"].get(rule["name"], 0) + 1
+        return [{"name": rule["tool"], "args": args, "id": f"intent_{uuid.uuid4().hex[:12]}", "type": "tool_call"}]
+
+    return None
+
+
+def intent_stats() -> dict:
+    """規則與命中率"""
+    total = _stats["total"]
+    return {
+        "rules": [{"name": r["name"], "pattern": r["pattern"], "tool": r["tool"]} for r in _rules],
+        "total": total,
+        "hits": _stats["hits"],
+        "hit_rate": _stats["hits"] / total if total else 0.0,
+        "by_rule": dict(_stats["by_rule"]),
+    }
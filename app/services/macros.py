@@ -0,0 +1,147 @@
+"""
+Macros - named tool-call sequences
+
+每天固定的操作 ("開電視、切 HDMI 2、音量 8、開 Netflix") 存成 macro，執行時不經過 LLM。
+執行前先編譯：連續的、不需要讀取輸出的 tool 在 capture_shell() 下執行，收集到的
+shell 指令 (含 "wait" 步驟的 sleep) 合併成一個 script，只送一次 ADB；需要讀畫面或
+使用者設定的 tool (截圖、目前 App、選 profile) 才單獨執行。
+"""
+
+import json
+
+from app.services.adb import capture_shell, shell
+from app.services.agent import execute_tool_call
+from app.services.database import get_pool
+from app.services.tv_tools import ALL_TOOLS
+
+
+TOOLS = {t.name: t for t in ALL_TOOLS}
+
+# 會讀取裝置輸出的 tool，不能放進 script
+OUTPUT_TOOLS = {"tv_screenshot", "tv_current_app"}
+
+MAX_WAIT_SECONDS = 60
+
+
+class MacroError(ValueError):
+    """Invalid macro definition"""
+
+
+def validate_steps(steps: list[dict]) -> list[dict]:
+    """檢查 tool 名稱與參數，回傳正規化後的 steps"""
+    if not steps:
+        raise MacroError("Macro has no steps")
+    validated = []
+    for i, step in enumerate(steps, 1):
+        name, args = step["name"], dict(step.get("args") or {})
+        if name == "wait":
+            seconds = args.get("seconds")
+            if not isinstance(seconds, (int, float)) or not 0 < seconds <= MAX_WAIT_SECONDS:
+                raise MacroError(f"Step {i}: wait needs 0 < seconds <= {MAX_WAIT_SECONDS}")
+        elif name in TOOLS:
+            try:
+                TOOLS[name].args_schema.model_validate(args)
+            except Exception as e:
+                raise MacroError(f"Step {i}: invalid args for {name}: {e}")
+        else:
+            raise MacroError(f"Step {i}: unknown tool '{name}'")
+        validated.append({"name": name, "args": args})
+    return validated
+
+
+def _scriptable(step: dict, user_profile: dict | None) -> bool:
+    if step["name"] in OUTPUT_TOOLS:
+        return False
+    # 有使用者設定時，啟動 App 會接著選 profile (需要等畫面)
+    if user_profile and step["name"] == "netflix_launch":
+        return False
+    if user_profile and user_profile.get("youtube_account_name") and step["name"] == "youtube_launch":
+        return False
+    return True
+
+
+async def compile_macro(steps: list[dict], user_profile: dict | None = None) -> list[dict]:
+    """
+    Compile macro steps into the fewest device invocations.
+
+    Returns:
+        plan items, either {"script": str, "results": [str]} for batched steps
+        or {"tool_call": dict} for a step that must run on its own
+    """
+    plan = []
+    commands, results = [], []
+    for step in steps:
+        if step["name"] == "wait":
+            commands.append(f"sleep {step['args']['seconds']:g}")
+        elif _scriptable(step, user_profile):
+            with capture_shell() as captured:
+                results.append(await TOOLS[step["name"]].ainvoke(step["args"]))
+            commands.extend(captured)
+        else:
+            if commands:
+                plan.append({"script": "; ".join(commands), "results": results})
+                commands, results = [], []
+            plan.append({"tool_call": {**step, "id": f"macro_{len(plan)}", "type": "tool_call"}})
+    if commands:
+        plan.append({"script": "; ".join(commands), "results": results})
+    return plan
+
+
+async def execute_plan(plan: list[dict], user_profile: dict | None = None) -> list[str]:
+    """執行編譯後的 macro，回傳每個 step 的結果訊息"""
+    results = []
+    for item in plan:
+        if "script" in item:
+            await shell(item["script"])
+            results.extend(item["results"])
+        else:
+            tool_result = await execute_tool_call(item["tool_call"], user_profile)
+            if tool_result is not None:
+                results.append(tool_result["result"])
+    return results
+
+
+# ==================== Storage ====================
+def _row_to_macro(row) -> dict:
+    return {"name": row["name"], "description": row["description"], "steps": json.loads(row["steps"])}
+
+
+async def list_macros() -> list[dict]:
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("SELECT name, description, steps FROM macros ORDER BY name")
+    return [_row_to_macro(row) for row in rows]
+
+
+async def get_macro(name: str) -> dict | None:
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow("SELECT name, description, steps FROM macros WHERE name = $1", name)
+    return _row_to_macro(row) if row else None
+
+
+async def create_macro(name: str, description: str | None, steps: list[dict]) -> None:
+    """新增 macro (名稱重複時 asyncpg.UniqueViolationError)"""
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            "INSERT INTO macros (name, description, steps) VALUES ($1, $2, $3::jsonb)",
+            name, description, json.dumps(steps, ensure_ascii=False)
+        )
+
+
+async def update_macro(name: str, description: str | None, steps: list[dict]) -> bool:
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        result = await conn.execute(
+            "UPDATE macros SET description = $2, steps = $3::jsonb, updated_at = NOW() WHERE name = $1",
+            name, description, json.dumps(steps, ensure_ascii=False)
+        )
+    return result != "UPDATE 0"
+
+
+async def delete_macro(name: str) -> bool:
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        result = await conn.execute("DELETE FROM macros WHERE name = $1", name)
+    return result != "DELETE 0"
@@ -0,0 +1,121 @@
+"""
+Prometheus metrics
+
+不依賴 prometheus_client 的精簡版：histogram / counter 都是記憶體中的 dict，
+記錄只是一次 bisect 加幾個整數相加，對請求路徑的成本可以忽略。
+/metrics 以 Prometheus text format (0.0.4) 輸出。
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from app.services.tracing import span
+
+
+# 從按一次鍵 (~10ms) 到 LLM 逾時 (30s)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label: str | None = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values: dict[str, float] = {}
+
+    def inc(self, label_value: str = "", amount: float = 1) -> None:
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for value, total in self._values.items():
+            labels = f'{{{self.label}="{_escape(value)}"}}' if self.label else ""
+            lines.append(f"{self.name}{labels} {total:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, label: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        # label value → [每個 bucket 的次數 (非累計)..., +Inf 次數, sum]
+        self._series: dict[str, list[float]] = {}
+
+    def observe(self, label_value: str, seconds: float) -> None:
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, seconds)] += 1
+        series[-1] += seconds
+
+    @contextmanager
+    def time(self, label_value: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - start)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value, series in self._series.items():
+            label = f'{self.label}="{_escape(value)}"'
+            cumulative = 0
+            for le, count in zip((*self.buckets, "+Inf"), series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {cumulative:g}')
+            lines.append(f"{self.name}_sum{{{label}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative:g}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "tv_agent_stage_seconds", "Time spent in each command pipeline stage", "stage"
+)
+TOOL_SECONDS = Histogram(
+    "tv_agent_tool_seconds", "Tool execution time", "tool"
+)
+COMMANDS = Counter(
+    "tv_agent_commands_total", "Commands processed, by where the tool calls came from", "source"
+)
+LLM_TOKENS = Counter(
+    "tv_agent_llm_tokens_total", "LLM tokens used", "type"
+)
+ADB_COMMANDS = Counter(
+    "tv_agent_adb_commands_total", "Commands sent to ADB", "kind"
+)
+ADB_FAILURES = Counter(
+    "tv_agent_adb_failures_total", "Failed ADB commands"
+)
+
+METRICS = [STAGE_SECONDS, TOOL_SECONDS, COMMANDS, LLM_TOKENS, ADB_COMMANDS, ADB_FAILURES]
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """`with stage("llm"):` 記錄一個 pipeline stage 的耗時，同時是目前 trace 的一個 span"""
+    with STAGE_SECONDS.time(name), span(name, **attributes) as current:
+        yield current
+
+
+def record_llm_usage(response) -> None:
+    """從 LangChain 回應的 usage_metadata 累計 token 數"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        LLM_TOKENS.inc("input", usage.get("input_tokens", 0))
+        LLM_TOKENS.inc("output", usage.get("output_tokens", 0))
+
+
+def render() -> str:
+    """Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,96 @@
+"""
+Persistent OCR worker pool
+
+pytesseract 每次呼叫都會啟動新的 `tesseract` process 並重新載入 traineddata。
+有安裝 tesserocr 時，每個 worker thread 各自持有一個 PyTessBaseAPI，語言資料只在
+啟動時載入一次，之後直接把記憶體中的 PIL Image 交給它辨識 (tesserocr 辨識時會
+釋放 GIL，所以 thread pool 可以真的平行)。沒有 tesserocr 時退回 pytesseract。
+
+同時執行的 OCR 數量由 OCR_MAX_WORKERS 限制，多出來的 job 在 pool 中排隊。
+"""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from PIL import Image
+import pytesseract
+
+from app.config import settings
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+
+T = TypeVar("T")
+
+_local = threading.local()
+
+
+def _init_worker() -> None:
+    """Worker thread initializer：載入語言資料"""
+    if tesserocr is not None:
+        _local.api = tesserocr.PyTessBaseAPI(lang=settings.OCR_LANG)
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.OCR_MAX_WORKERS, thread_name_prefix="ocr", initializer=_init_worker
+)
+
+
+def backend() -> str:
+    return "tesserocr" if tesserocr is not None else "pytesseract"
+
+
+def image_to_data(img: Image.Image) -> dict[str, list]:
+    """
+    Word-level OCR of an in-memory image.
+
+    Must run on a pool worker. Returns the same columns as
+    `pytesseract.image_to_data(..., output_type=DICT)`: text, conf, left, top, width, height.
+    """
+    api = getattr(_local, "api", None)
+    if api is None:
+        return pytesseract.image_to_data(img, lang=settings.OCR_LANG, output_type=pytesseract.Output.DICT)
+
+    data = {"text": [], "conf": [], "left": [], "top": [], "width": [], "height": []}
+    api.SetImage(img)
+    api.Recognize()
+    level = tesserocr.RIL.WORD
+    for word in tesserocr.iterate_level(api.GetIterator(), level):
+        text = word.GetUTF8Text(level)
+        box = word.BoundingBox(level)
+        if not text or box is None:
+            continue
+        left, top, right, bottom = box
+        data["text"].append(text)
+        data["conf"].append(word.Confidence(level))
+        data["left"].append(left)
+        data["top"].append(top)
+        data["width"].append(right - left)
+        data["height"].append(bottom - top)
+    api.Clear()
+    return data
+
+
+async def run(func: Callable[..., T], *args) -> T:
+    """在 OCR pool 中執行同步函式 (帶著目前的 context，worker 中的 trace span 才會記到同一個請求)"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, context.run, func, *args)
+
+
+async def start_ocr_pool() -> None:
+    """啟動所有 worker，讓語言資料在第一個請求前就載入完成"""
+    barrier = threading.Barrier(settings.OCR_MAX_WORKERS, timeout=30)
+    # 每個 job 都卡在 barrier 上，pool 只能開新的 thread 來接下一個 job
+    await asyncio.gather(*(run(barrier.wait) for _ in range(settings.OCR_MAX_WORKERS)))
+
+
+def close_ocr_pool() -> None:
+    """停止 worker threads"""
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,254 @@
+"""
+Per-device command scheduler
+
+每台電視一個 FIFO 佇列：同一個請求的 tool calls 以單一 job 原子執行，
+不同請求的按鍵不會交錯。佇列中相鄰、可合併的 job 會被合併 (例如三次音量 +1
+變成一次 +3)，被新指令取代的導航 job 則會在執行前取消。
+
+LLM 還在 streaming 時就可以排入 streaming job：tool calls 由 async iterator 陸續
+提供，job 開始執行後每解析完一個就執行一個。
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from app.config import settings
+from app.services.adb import current_device
+from app.services.metrics import STAGE_SECONDS
+from app.services.tracing import add_span, attach, capture, span
+
+
+# tool 名稱 → 合併規則
+# field: 要相加的參數, default: 參數預設值, max: 上限, key: 必須相同才能合併的參數, exclude: 不合併的參數值,
+# unit: tool 實際以這個單位執行 (不足一個單位也算一個)，相加前先換算成執行的量
+COALESCE_RULES = {
+    "tv_volume": {"field": "steps", "default": 1, "max": 15, "key": ("action",), "exclude": {"action": "mute"}},
+    "tv_navigate": {"field": "steps", "default": 1, "max": 20, "key": ("direction",)},
+    "rewind": {"field": "seconds", "default": 10, "max": 60, "key": ("app",), "unit": 10},
+    "fast_forward": {"field": "seconds", "default": 10, "max": 60, "key": ("app",), "unit": 10},
+}
+
+# 只移動焦點的 tool / 按鍵；畫面切換後這些 job 就失去意義。確認、選單、搜尋等按鍵不算
+NAVIGATION_TOOLS = {"tv_navigate"}
+DIRECTION_KEYS = {"up", "down", "left", "right"}
+
+# 會切換畫面 / App 的 tool，排入時會取消尚未執行的導航 job
+SCREEN_CHANGING_TOOLS = {
+    "tv_power", "tv_input_source",
+    "youtube_launch", "youtube_close", "youtube_search", "youtube_play", "youtube_channel", "youtube_navigate",
+    "netflix_launch", "netflix_close", "netflix_search", "netflix_play", "netflix_navigate",
+}
+
+
+class JobSuperseded(Exception):
+    """Raised to waiters of a job that was cancelled by a newer command"""
+
+
+JobRunner = Callable[[list[dict]], Awaitable[Any]]
+StreamRunner = Callable[[AsyncIterator[dict]], Awaitable[Any]]
+
+
+@dataclass
+class Job:
+    tool_calls: list[dict]
+    runner: JobRunner
+    waiters: list[asyncio.Future] = field(default_factory=list)
+    # streaming job 的 tool calls 還沒決定：不合併，也不會被當成導航 job 取消
+    streaming: bool = False
+    # runner 不是逐一執行 tool_calls 的 job (例如編譯好的 macro) 不能合併
+    mergeable: bool = True
+    queued_at: float = field(default_factory=time.perf_counter)
+    # 送出 job 的請求的 trace；合併進來的 job 共用第一個 job 的 trace
+    trace_context: tuple = field(default_factory=capture)
+
+    @property
+    def is_navigation(self) -> bool:
+        return not self.streaming and all(
+            tc["name"] in NAVIGATION_TOOLS or (tc["name"] == "tv_remote" and tc["args"].get("key") in DIRECTION_KEYS)
+            for tc in self.tool_calls
+        )
+
+    @property
+    def changes_screen(self) -> bool:
+        return any(
+            tc["name"] in SCREEN_CHANGING_TOOLS
+            or (tc["name"] == "tv_remote" and tc["args"].get("key") in ("home", "back"))
+            for tc in self.tool_calls
+        )
+
+    def resolve(self, result: Any = None, error: BaseException | None = None) -> None:
+        for waiter in self.waiters:
+            if waiter.done():
+                continue
+            if error is not None:
+                waiter.set_exception(error)
+            else:
+                waiter.set_result(result)
+
+
+def _merge(pending: Job, job: Job) -> bool:
+    """嘗試把 job 合併進 pending (就地修改)，成功回傳 True"""
+    if not (pending.mergeable and job.mergeable) or len(pending.tool_calls) != 1 or len(job.tool_calls) != 1:
+        return False
+
+    a, b = pending.tool_calls[0], job.tool_calls[0]
+    rule = COALESCE_RULES.get(a["name"])
+    if rule is None or a["name"] != b["name"]:
+        return False
+    if any(a["args"].get(k) != b["args"].get(k) for k in rule["key"]):
+        return False
+    if any(a["args"].get(k) == v for k, v in rule.get("exclude", {}).items()):
+        return False
+
+    def amount(tc: dict) -> int:
+        value = tc["args"].get(rule["field"], rule["default"])
+        unit = rule.get("unit", 1)
+        return max(1, value // unit) * unit
+
+    total = amount(a) + amount(b)
+    if total > rule["max"]:
+        return False
+
+    a["args"][rule["field"]] = total
+    pending.waiters.extend(job.waiters)
+    return True
+
+
+class DeviceScheduler:
+    """FIFO job queue with a single worker for one device"""
+
+    def __init__(self, device_id: str):
+        self.device_id = device_id
+        self._pending: deque[Job] = deque()
+        self._has_jobs = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def submit(self, tool_calls: list[dict], runner: JobRunner, mergeable: bool = True) -> Any:
+        """
+        排入一個 job 並等待結果
+
+        mergeable=False 的 job 不會和相鄰的 job 合併
+
+        Raises:
+            JobSuperseded: job 在執行前被較新的指令取消
+        """
+        job = Job(
+            tool_calls=[{**tc, "args": dict(tc["args"])} for tc in tool_calls],
+            runner=runner,
+            mergeable=mergeable,
+        )
+        if job.changes_screen:
+            self.cancel_pending(lambda pending: pending.is_navigation)
+        return await self._enqueue(job)
+
+    async def submit_stream(self, first: dict, rest: AsyncIterator[dict], runner: StreamRunner) -> Any:
+        """
+        排入 tool calls 還在產生中的 job 並等待結果
+
+        first 是已經決定的第一個 tool call (還沒有 tool call 時不要排入，以免 LLM 產生
+        期間佔住佇列)；runner 會在 job 開始執行時拿到依序產生 first 與 rest 的 iterator
+
+        Raises:
+            JobSuperseded: job 在執行前被較新的指令取消
+        """
+        async def tool_calls() -> AsyncIterator[dict]:
+            yield first
+            async for tc in rest:
+                yield tc
+
+        job = Job(tool_calls=[first], runner=lambda _: runner(tool_calls()), streaming=True, mergeable=False)
+        if job.changes_screen:
+            self.cancel_pending(lambda pending: pending.is_navigation)
+        return await self._enqueue(job)
+
+    async def _enqueue(self, job: Job) -> Any:
+        waiter = asyncio.get_running_loop().create_future()
+        job.waiters.append(waiter)
+
+        if not (self._pending and _merge(self._pending[-1], job)):
+            self._pending.append(job)
+            self._has_jobs.set()
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+        return await waiter
+
+    def cancel_pending(self, predicate: Callable[[Job], bool] = lambda job: True) -> int:
+        """取消尚未執行且符合條件的 job，回傳取消的數量"""
+        kept = deque()
+        cancelled = 0
+        for job in self._pending:
+            if predicate(job):
+                job.resolve(error=JobSuperseded("已被較新的指令取代"))
+                cancelled += 1
+            else:
+                kept.append(job)
+        self._pending = kept
+        if not self._pending:
+            self._has_jobs.clear()
+        return cancelled
+
+    async def _run(self) -> None:
+        # worker task 有自己的 context，tools 透過 current_device 取得要操作的電視
+        current_device.set(self.device_id)
+        while True:
+            await self._has_jobs.wait()
+            job = self._pending.popleft()
+            if not self._pending:
+                self._has_jobs.clear()
+
+            STAGE_SECONDS.observe("queue", time.perf_counter() - job.queued_at)
+            with attach(job.trace_context):
+                add_span("queue", job.queued_at, time.perf_counter(), device=self.device_id)
+                try:
+                    with STAGE_SECONDS.time("execute"), span("execute", device=self.device_id, requests=len(job.waiters)):
+                        result = await job.runner(job.tool_calls)
+                except asyncio.CancelledError:
+                    job.resolve(error=JobSuperseded("排程器已關閉"))
+                    raise
+                except Exception as e:
+                    job.resolve(error=e)
+                else:
+                    job.resolve(result)
+
+    async def close(self) -> None:
+        self.cancel_pending()
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+
+_schedulers: dict[str, DeviceScheduler] = {}
+
+
+def get_scheduler(device_id: str | None = None) -> DeviceScheduler:
+    """取得裝置的排程器 (每台裝置一個)"""
+    device_id = device_id or settings.DEVICE_ID
+    scheduler = _schedulers.get(device_id)
+    if scheduler is None:
+        scheduler = _schedulers[device_id] = DeviceScheduler(device_id)
+    return scheduler
+
+
+def queue_depths() -> dict[str, int]:
+    """各裝置排隊中 (尚未執行) 的 job 數量"""
+    return {device_id: scheduler.pending_count for device_id, scheduler in _schedulers.items()}
+
+
+async def close_schedulers() -> None:
+    """關閉所有排程器"""
+    for scheduler in _schedulers.values():
+        await scheduler.close()
+    _schedulers.clear()
@@ -0,0 +1,43 @@
+"""
+Screen-content readiness
+
+YouTube TV / Netflix 只有一個 activity，選完帳號 / profile 之後焦點視窗不會變，
+所以改成看畫面本身：整個畫面的 dHash 和選擇前不同，而且連續兩次截圖相同，才算進入下一個畫面。
+"""
+
+from app.config import settings
+from app.services import ocr_pool
+from app.services.adb import wait_for
+from app.services.tracing import annotate, span
+from app.services.youtube_ocr import capture_screen, image_hash
+
+# 整個畫面縮成 32x18 (16:9) 再算 dHash
+SCREEN_HASH_SIZE = (32, 18)
+
+
+async def screen_hash() -> int:
+    """目前畫面的 dHash"""
+    image = await capture_screen()
+    return await ocr_pool.run(image_hash, image, SCREEN_HASH_SIZE)
+
+
+async def wait_for_screen_change(before: int, timeout: float | None = None) -> bool:
+    """
+    等到畫面離開 before (screen_hash() 的結果) 並且穩定下來
+    
+    Returns:
+        是否在逾時前完成轉場
+    """
+    last = None
+    
+    async def ready() -> bool:
+        nonlocal last
+        previous = last
+        last = await screen_hash()
+        changed = (last ^ before).bit_count() >= settings.SCREEN_CHANGE_MIN_DISTANCE
+        return changed and previous is not None and (previous ^ last).bit_count() <= settings.OCR_HASH_MAX_DISTANCE
+    
+    with span("wait_for_screen_change"):
+        changed = await wait_for(ready, timeout)
+        annotate(changed=changed)
+    return changed
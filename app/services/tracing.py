@@ -0,0 +1,279 @@
+"""
+Request tracing
+
+每個請求一個 trace，記錄 LLM 呼叫、每個 ADB 指令 (完整指令字串)、等待與 OCR
+(辨識到的帳號名稱) 的 span。完成的 trace 放進固定大小的 ring buffer：
+deque(maxlen=...) 的 append 是 atomic 的，記錄時不需要 lock，舊的 trace 自動被擠掉。
+/debug/traces 以 waterfall 形式回傳每個 span 的開始時間與耗時。
+
+設定 TRACE_OTLP_FILE 時，每個 trace 另外以 OTLP/JSON 一行寫入檔案 (不需要網路)，
+可以用 OpenTelemetry Collector 的 otlpjsonfile receiver 匯入 Jaeger / Tempo。
+"""
+
+import json
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from app.config import settings
+
+
+def _span_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+@dataclass
+class Span:
+    name: str
+    parent_id: str | None
+    start: float  # time.perf_counter()
+    end: float | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+    span_id: str = field(default_factory=_span_id)
+
+
+@dataclass
+class Trace:
+    name: str
+    attributes: dict[str, Any] = field(default_factory=dict)
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    # 根 span 的 id；最上層的 span 以它為 parent
+    span_id: str = field(default_factory=_span_id)
+    started_at: float = field(default_factory=time.time)
+    start: float = field(default_factory=time.perf_counter)
+    end: float | None = None
+    error: str | None = None
+    spans: list[Span] = field(default_factory=list)
+
+    def offset_ms(self, t: float) -> float:
+        return round((t - self.start) * 1000, 3)
+
+    def unix_nano(self, t: float) -> int:
+        return int((self.started_at + t - self.start) * 1e9)
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+# 最近完成的 trace (新的在右邊)
+_traces: deque[Trace] = deque(maxlen=settings.TRACE_BUFFER_SIZE)
+
+
+@contextmanager
+def start_trace(name: str, **attributes):
+    """`with start_trace("command", text=...) as trace:` 在這個 context 中記錄 span"""
+    if not settings.TRACE_ENABLED:
+        yield None
+        return
+    trace = Trace(name, attributes)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        trace.end = time.perf_counter()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        _traces.append(trace)
+        if settings.TRACE_OTLP_FILE:
+            _export(trace)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """`with span("adb.shell", command=cmd):`；不在 trace 中時什麼都不做"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else None, time.perf_counter(), attributes=attributes)
+    trace.spans.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def add_span(name: str, start: float, end: float, **attributes) -> None:
+    """記錄一個已經結束的 span (start / end 是 time.perf_counter())"""
+    trace = _current_trace.get()
+    if trace is not None:
+        parent = _current_span.get()
+        trace.spans.append(Span(name, parent.span_id if parent else None, start, end, attributes))
+
+
+def annotate(**attributes) -> None:
+    """在目前的 span 加上 attributes"""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def capture() -> tuple[Trace | None, Span | None]:
+    """目前的 trace context，交給在其他 task 執行的工作 (例如排程器的 job)"""
+    return _current_trace.get(), _current_span.get()
+
+
+@contextmanager
+def attach(context: tuple[Trace | None, Span | None]):
+    """在 capture() 取得的 trace context 中執行"""
+    trace_token = _current_trace.set(context[0])
+    span_token = _current_span.set(context[1])
+    try:
+        yield
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+# ==================== Queries ====================
+def _duration_ms(start: float, end: float | None) -> float | None:
+    return None if end is None else round((end - start) * 1000, 3)
+
+
+def list_traces(limit: int = 50) -> list[dict]:
+    """最近的 trace 摘要 (新的在前)"""
+    summaries = []
+    for trace in reversed(_traces):
+        if len(summaries) >= limit:
+            break
+        summaries.append({
+            "trace_id": trace.trace_id,
+            "name": trace.name,
+            "started_at": trace.started_at,
+            "duration_ms": _duration_ms(trace.start, trace.end),
+            "spans": len(trace.spans),
+            "error": trace.error,
+            "attributes": trace.attributes,
+        })
+    return summaries
+
+
+def get_trace(trace_id: str) -> Trace | None:
+    return next((trace for trace in _traces if trace.trace_id == trace_id), None)
+
+
+def waterfall(trace: Trace) -> dict:
+    """依開始時間排序的 span，offset_ms 是相對於請求開始的時間"""
+    depths = {None: 0}
+    spans = []
+    for s in sorted(trace.spans, key=lambda s: s.start):
+        depth = depths.get(s.parent_id, 0) + (s.parent_id is not None)
+        depths[s.span_id] = depth
+        spans.append({
+            "span_id": s.span_id,
+            "parent_id": s.parent_id,
+            "name": s.name,
+            "depth": depth,
+            "offset_ms": trace.offset_ms(s.start),
+            "duration_ms": _duration_ms(s.start, s.end),
+            "attributes": s.attributes,
+            "error": s.error,
+        })
+    return {
+        "trace_id": trace.trace_id,
+        "name": trace.name,
+        "started_at": trace.started_at,
+        "duration_ms": _duration_ms(trace.start, trace.end),
+        "error": trace.error,
+        "attributes": trace.attributes,
+        "spans": spans,
+    }
+
+
+def render_waterfall(trace: Trace, width: int = 60) -> str:
+    """純文字的 waterfall，方便直接在 terminal 看"""
+    data = waterfall(trace)
+    total = data["duration_ms"] or max((s["offset_ms"] + (s["duration_ms"] or 0) for s in data["spans"]), default=0)
+    scale = width / total if total else 0
+    lines = [f'{data["name"]} {data["trace_id"]}  {total:.1f}ms  {json.dumps(data["attributes"], ensure_ascii=False)}']
+    for s in data["spans"]:
+        duration = s["duration_ms"] or 0
+        begin = min(width - 1, int(s["offset_ms"] * scale))
+        bar = (" " * begin + "█" * max(1, round(duration * scale)))[:width]
+        detail = " ".join(f"{k}={v}" for k, v in s["attributes"].items() if v is not None)
+        if s["error"]:
+            detail += f" ✗ {s['error']}"
+        lines.append(f'{s["offset_ms"]:9.1f}ms {duration:9.1f}ms |{bar.ljust(width)}| {"  " * s["depth"]}{s["name"]} {detail}'.rstrip())
+    return "\n".join(lines) + "\n"
+
+
+# ==================== OTLP file exporter ====================
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, str):
+        return {"stringValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": json.dumps(value, ensure_ascii=False, default=str)}
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def _otlp_span(trace: Trace, span_id: str, parent_id: str | None, name: str, start: float, end: float | None,
+               attributes: dict, error: str | None, kind: int) -> dict:
+    otlp = {
+        "traceId": trace.trace_id,
+        "spanId": span_id,
+        "name": name,
+        "kind": kind,
+        "startTimeUnixNano": str(trace.unix_nano(start)),
+        "endTimeUnixNano": str(trace.unix_nano(end if end is not None else trace.end)),
+        "attributes": _otlp_attributes(attributes),
+        # STATUS_CODE_ERROR = 2
+        "status": {"code": 2, "message": error} if error else {},
+    }
+    if parent_id:
+        otlp["parentSpanId"] = parent_id
+    return otlp
+
+
+def to_otlp(trace: Trace) -> dict:
+    """OTLP/JSON (ExportTraceServiceRequest) 格式"""
+    # SPAN_KIND_SERVER = 2, SPAN_KIND_INTERNAL = 1
+    spans = [_otlp_span(trace, trace.span_id, None, trace.name, trace.start, trace.end,
+                        trace.attributes, trace.error, 2)]
+    for s in trace.spans:
+        spans.append(_otlp_span(trace, s.span_id, s.parent_id or trace.span_id, s.name, s.start, s.end,
+                                s.attributes, s.error, 1))
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": "tv-agent"})},
+            "scopeSpans": [{"scope": {"name": "app.services.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+def _export(trace: Trace) -> None:
+    try:
+        line = json.dumps(to_otlp(trace), ensure_ascii=False) + "\n"
+        # 一次 write 一行，O_APPEND 讓多個 worker process 寫同一個檔案也不會交錯
+        fd = os.open(settings.TRACE_OTLP_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+    except Exception as e:
+        print(f"Trace export error: {e}")
@@ -0,0 +1,107 @@
+"""
+Startup pre-warming
+
+第一個指令不應該付冷啟動成本：啟動時在背景同時預熱 ADB transport (連線 + 長駐
+shell)、LLM 連線 (TLS 握手) 與 OCR 引擎 (import PIL / NumPy / pytesseract、載入語言
+資料與帳號樣板)。各元件的狀態與耗時由 /health 回報，全部完成前 /health/ready 回傳 503。
+"""
+
+import asyncio
+import sys
+import time
+from typing import Awaitable, Callable
+
+from app.config import settings
+from app.services.adb import get_shell_session
+from app.services.agent import init_agent
+from app.services.connection import get_connection_manager
+
+
+# 每個 warmer 可以回傳要顯示在 /health 的額外資訊
+async def _warm_adb() -> None:
+    connected = 0
+    for device_id in settings.DEVICES.values():
+        if await get_connection_manager(device_id).check():
+            await get_shell_session(device_id).run("true")
+            connected += 1
+    if not connected:
+        raise RuntimeError("No TV connected")
+
+
+async def _warm_llm() -> None:
+    await init_agent()
+
+
+async def _warm_ocr() -> dict:
+    # OCR 相關模組很重，不在 import app.main 時載入
+    from app.services import account_templates, ocr_pool, youtube_ocr
+
+    await ocr_pool.start_ocr_pool()
+    await account_templates.load_templates()
+    if ocr_pool.backend() != "tesserocr":
+        print("   ⚠ tesserocr not installed: every OCR call starts a tesseract process (install tv-agent[ocr])")
+    return {"backend": ocr_pool.backend()}
+
+
+WARMERS: dict[str, Callable[[], Awaitable[dict | None]]] = {
+    "adb": _warm_adb,
+    "llm": _warm_llm,
+    "ocr": _warm_ocr,
+}
+
+_status: dict[str, dict] = {name: {"status": "pending"} for name in WARMERS}
+_task: asyncio.Task | None = None
+
+
+async def _run(name: str) -> None:
+    start = time.perf_counter()
+    try:
+        info = await WARMERS[name]()
+    except Exception as e:
+        _status[name] = {"status": "error", "seconds": round(time.perf_counter() - start, 3), "error": str(e)}
+        print(f"   ✗ {name} warm-up error: {e}")
+    else:
+        _status[name] = {"status": "ok", "seconds": round(time.perf_counter() - start, 3), **(info or {})}
+        print(f"   ✓ {name} warmed up in {_status[name]['seconds']}s")
+
+
+async def prewarm() -> None:
+    """同時預熱所有元件"""
+    await asyncio.gather(*(_run(name) for name in WARMERS))
+
+
+def start_warmup() -> None:
+    """在背景開始預熱，不擋住啟動"""
+    global _task
+    _task = asyncio.create_task(prewarm())
+
+
+async def stop_warmup() -> None:
+    """取消尚未完成的預熱，關閉 OCR pool (有載入過才需要)"""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+    ocr_pool = sys.modules.get("app.services.ocr_pool")
+    if ocr_pool is not None:
+        ocr_pool.close_ocr_pool()
+
+
+def readiness() -> dict:
+    """
+    Warm-up state for /health
+
+    ready: every component finished warming up (successfully or not)
+    status: "ok" when all succeeded, otherwise "degraded" / "starting"
+    """
+    states = {c["status"] for c in _status.values()}
+    ready = "pending" not in states
+    if not ready:
+        status = "starting"
+    elif states == {"ok"}:
+        status = "ok"
+    else:
+        status = "degraded"
+    return {"ready": ready, "status": status, "components": {name: dict(c) for name, c in _status.items()}}
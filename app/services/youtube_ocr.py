@@ -1,35 +1,165 @@
 """
 YouTube account detection using OCR
+
+已登錄樣板的帳號用 NumPy template matching 辨識 (見 account_templates)，
+沒有樣板或比對不到時才用 Tesseract。
 """
 
-import subprocess
-from PIL import Image
-import pytesseract
+import struct
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageOps, ImageStat
 
 from app.config import settings
-from app.services.adb import adb_command
+from app.services import account_templates, ocr_pool
+from app.services.adb import get_device_id, screencap, wait_for
+from app.services.database import get_youtube_account_layout, save_youtube_account_layout
+from app.services.metrics import stage
+from app.services.tracing import annotate, span
+
+
+# screencap raw 格式: width, height, pixel format (+ Android 9 起多一個 colorspace) 各 4 bytes，接著是像素
+# Android PixelFormat → (PIL mode, raw decoder mode)；都是 4 bytes/pixel
+PIXEL_FORMATS = {
+    1: ("RGBA", "RGBA"),  # RGBA_8888
+    2: ("RGB", "RGBX"),   # RGBX_8888
+    5: ("RGBA", "BGRA"),  # BGRA_8888
+}
+
+
+class UnsupportedScreencapFormat(ValueError):
+    """Raw framebuffer in a pixel format we do not decode"""
+
+# 帳號列座標是以 1080p 畫面量測的
+REFERENCE_HEIGHT = 1080
+
+
+def decode_screencap(data: bytes) -> Image.Image:
+    """把 `screencap` 的 raw framebuffer 解碼成 PIL Image (不複製像素資料)"""
+    width, height, pixel_format = struct.unpack_from("<III", data)
+    if pixel_format not in PIXEL_FORMATS:
+        raise UnsupportedScreencapFormat(f"Unsupported screencap pixel format: {pixel_format}")
+    header_size = len(data) - width * height * 4
+    if header_size not in (12, 16):
+        raise UnsupportedScreencapFormat(f"Unexpected screencap size: {len(data)} bytes for {width}x{height}")
+    mode, raw_mode = PIXEL_FORMATS[pixel_format]
+    return Image.frombuffer(mode, (width, height), memoryview(data)[header_size:], "raw", raw_mode, 0, 1)
+
+
+# raw framebuffer 無法解碼的電視 (例如 RGB_565)，之後直接要 PNG
+_png_devices: set[str] = set()
+
+
+async def capture_screen() -> Image.Image:
+    """Capture TV screen into memory (one exec-out round-trip, no temp files)"""
+    device_id = get_device_id()
+    if device_id not in _png_devices:
+        try:
+            return decode_screencap(await screencap())
+        except UnsupportedScreencapFormat as e:
+            print(f"Raw screencap not supported on {device_id} ({e}), using PNG")
+            _png_devices.add(device_id)
+    image = Image.open(BytesIO(await screencap(png=True)))
+    image.load()
+    return image
+
+
+def _parse_band(value: str) -> tuple[int, int, int, int]:
+    left, top, right, bottom = (int(v) for v in value.split(","))
+    return left, top, right, bottom
+
 
+def crop_account_band(img: Image.Image) -> tuple[Image.Image, tuple[int, int], float]:
+    """
+    Crop the account-name band and prepare it for OCR.
+    
+    The band is configured in 1080p coordinates; larger screenshots are
+    downscaled to 1080p, converted to grayscale, inverted when the text is
+    light-on-dark and binarized.
+    
+    Returns:
+        (processed crop, (left, top) offset in screenshot pixels, scale from screenshot to crop)
+    """
+    scale = min(1.0, REFERENCE_HEIGHT / img.height)
+    left, top, right, bottom = (round(v / scale) for v in _parse_band(settings.YOUTUBE_ACCOUNT_BAND))
+    crop = img.crop((left, top, min(right, img.width), min(bottom, img.height))).convert("L")
+    if scale < 1.0:
+        crop = crop.resize((round(crop.width * scale), round(crop.height * scale)), Image.Resampling.BILINEAR)
+    
+    # Tesseract 對白底黑字最準；YouTube TV 是深色背景
+    if ImageStat.Stat(crop).mean[0] < 128:
+        crop = ImageOps.invert(crop)
+    threshold = settings.OCR_BINARIZE_THRESHOLD
+    crop = crop.point(lambda p: 255 if p > threshold else 0)
+    return crop, (left, top), scale
+
+
+def image_hash(img: Image.Image, size: tuple[int, int] = (64, 8)) -> int:
+    """Difference hash (dHash)；帳號列很寬，所以用 64x8 = 512 bits"""
+    width, height = size
+    pixels = list(img.convert("L").resize((width + 1, height), Image.Resampling.BILINEAR).getdata())
+    bits = 0
+    for row in range(height):
+        offset = row * (width + 1)
+        for col in range(width):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
 
-def capture_screen() -> str:
-    """Capture TV screen and return local path"""
-    path = "/tmp/tv_youtube_accounts.png"
-    adb_command("shell screencap -p /sdcard/screenshot.png")
-    adb_command(f"pull /sdcard/screenshot.png {path}")
-    adb_command("shell rm /sdcard/screenshot.png")
-    return path
 
+# 感知雜湊 → 辨識結果；「誰在觀看」畫面沒變時不需要再跑 Tesseract
+# 多台電視同時辨識時，OCR worker threads 會同時讀寫，所以要加 lock
+_ocr_cache: OrderedDict[int, list[dict]] = OrderedDict()
+_ocr_cache_lock = threading.Lock()
 
-def detect_youtube_accounts(image_path: str) -> list[dict]:
+
+def _cached_accounts(band_hash: int) -> list[dict] | None:
+    with _ocr_cache_lock:
+        for cached_hash, accounts in _ocr_cache.items():
+            if (cached_hash ^ band_hash).bit_count() <= settings.OCR_HASH_MAX_DISTANCE:
+                _ocr_cache.move_to_end(cached_hash)
+                return [dict(a) for a in accounts]
+    return None
+
+
+def _cache_accounts(band_hash: int, accounts: list[dict]) -> None:
+    with _ocr_cache_lock:
+        _ocr_cache[band_hash] = [dict(a) for a in accounts]
+        while len(_ocr_cache) > settings.OCR_CACHE_SIZE:
+            _ocr_cache.popitem(last=False)
+
+
+def detect_youtube_accounts(img: Image.Image) -> list[dict]:
     """
     Detect YouTube account names and their positions.
     
+    Enrolled templates are tried first; Tesseract is the fallback.
+    
     Returns:
         List of dicts with 'name' and 'x' position, sorted by x
     """
-    img = Image.open(image_path)
+    band, (left, top), scale = crop_account_band(img)
+    with stage("template_match"):
+        accounts = account_templates.match_accounts(band, round(left * scale), round(top * scale))
+        annotate(matched=len(accounts))
+    if accounts:
+        return accounts
+    return _ocr_accounts(band, (left, top), scale)
+
+
+def _ocr_accounts(band: Image.Image, offset: tuple[int, int], scale: float) -> list[dict]:
+    """Tesseract recognizer (results cached by the band's perceptual hash)"""
+    left, top = offset
+    band_hash = image_hash(band)
+    cached = _cached_accounts(band_hash)
+    if cached is not None:
+        return cached
     
     # Get OCR data with position info (use both Chinese and English)
-    data = pytesseract.image_to_data(img, lang='chi_tra+eng', output_type=pytesseract.Output.DICT)
+    with stage("ocr"):
+        data = ocr_pool.image_to_data(band)
     
     accounts = []
     
@@ -46,13 +176,13 @@ def detect_youtube_accounts(image_path: str) -> list[dict]:
             continue
         
         # Filter by confidence
-        conf = int(data['conf'][i])
+        conf = int(float(data['conf'][i]))
         if conf < 85:
             continue
         
-        # Get position
-        x = data['left'][i]
-        y = data['top'][i]
+        # Get position in 1080p screenshot coordinates
+        x = round(left * scale) + data['left'][i]
+        y = round(top * scale) + data['top'][i]
         
         # Account names appear around y=630-660 range
         # x can be anywhere from 300 to 1200 (accounts area)
@@ -61,12 +191,14 @@ def detect_youtube_accounts(image_path: str) -> list[dict]:
                 accounts.append({
                     'name': text,
                     'x': x + data['width'][i] // 2,  # center x
-                    'y': y
+                    'y': y,
+                    'width': data['width'][i]
                 })
     
     # Sort by x position (left to right)
     accounts.sort(key=lambda a: a['x'])
     
+    _cache_accounts(band_hash, accounts)
     return accounts
 
 
@@ -90,10 +222,98 @@ def find_account_position(target_name: str, accounts: list[dict]) -> int | None:
     return None
 
 
-def detect_and_find_youtube_account(target_name: str) -> tuple[int | None, list[str]]:
+def _enroll_templates(img: Image.Image) -> dict[str, np.ndarray]:
+    band, offset, scale = crop_account_band(img)
+    accounts = _ocr_accounts(band, offset, scale)
+    pixels = account_templates.to_array(band)
+    padding = settings.YOUTUBE_TEMPLATE_PADDING
+    
+    templates = {}
+    for account in accounts:
+        # 換回帳號列內的座標
+        center = account['x'] - round(offset[0] * scale)
+        start = max(0, center - account['width'] // 2 - padding)
+        end = min(pixels.shape[1], center + (account['width'] + 1) // 2 + padding)
+        templates[account['name']] = pixels[:, start:end].copy()
+    return templates
+
+
+async def enroll_youtube_accounts() -> list[str]:
+    """
+    Enroll templates for every account on the current "Who's watching" screen.
+    
+    Runs Tesseract once and stores a crop of each recognized name.
+    
+    Returns:
+        Enrolled account names
+    """
+    image = await capture_screen()
+    templates = await ocr_pool.run(_enroll_templates, image)
+    for name, template in templates.items():
+        await account_templates.save_template(name, template)
+    return list(templates)
+
+
+def _band_signature(img: Image.Image) -> tuple[int, bool]:
+    """帳號列的 dHash，以及帳號列上是否有字"""
+    band = crop_account_band(img)[0]
+    has_text = bool(account_templates.text_spans(account_templates.to_array(band), settings.YOUTUBE_NAME_MIN_GAP))
+    return image_hash(band), has_text
+
+
+async def wait_for_account_screen(timeout: float | None = None) -> tuple[Image.Image, int]:
+    """
+    Wait until the account names are on screen and stable.
+    
+    YouTube TV keeps the same focused window from the splash to the account
+    picker, so readiness is judged from the screen itself: the account band
+    must contain text and hash the same on two consecutive captures. On
+    timeout the last capture is used.
+    
+    Returns:
+        (last screenshot, its account-band hash)
+    """
+    image = None
+    band_hash = None
+    
+    async def ready() -> bool:
+        nonlocal image, band_hash
+        previous = band_hash
+        image = await capture_screen()
+        band_hash, has_text = await ocr_pool.run(_band_signature, image)
+        return has_text and previous is not None and (previous ^ band_hash).bit_count() <= settings.OCR_HASH_MAX_DISTANCE
+    
+    await wait_for(ready, timeout)
+    return image, band_hash
+
+
+# device_id → {"account_names", "band_hash"}；和資料庫同步的帳號順序
+_layouts: dict[str, dict] = {}
+
+
+async def _get_layout(device_id: str) -> dict | None:
+    if device_id not in _layouts:
+        layout = await get_youtube_account_layout(device_id)
+        if layout is None:
+            return None
+        _layouts[device_id] = layout
+    return _layouts[device_id]
+
+
+async def _save_layout(device_id: str, account_names: list[str], band_hash: int) -> None:
+    layout = {"account_names": account_names, "band_hash": f"{band_hash:x}"}
+    _layouts[device_id] = layout
+    await save_youtube_account_layout(device_id, account_names, layout["band_hash"])
+
+
+async def detect_and_find_youtube_account(target_name: str) -> tuple[int | None, list[str]]:
     """
     Capture screen, detect accounts, and find target account position.
     
+    Each TV remembers the last detected account order. When the account
+    band still hashes the same as when it was learned, the cached order is
+    used directly and OCR is skipped.
+    
     Args:
         target_name: Account name to find
     
@@ -101,11 +321,26 @@ def detect_and_find_youtube_account(target_name: str) -> tuple[int | None, list[
         Tuple of (position or None, list of detected account names)
     """
     try:
-        image_path = capture_screen()
-        accounts = detect_youtube_accounts(image_path)
+        device_id = get_device_id()
+        await account_templates.load_templates()
+        image, band_hash = await wait_for_account_screen()
+        
+        layout = await _get_layout(device_id)
+        if layout and (int(layout["band_hash"], 16) ^ band_hash).bit_count() <= settings.OCR_HASH_MAX_DISTANCE:
+            accounts = [{"name": name} for name in layout["account_names"]]
+            position = find_account_position(target_name, accounts)
+            if position:
+                annotate(accounts=layout["account_names"], source="layout")
+                return position, layout["account_names"]
+        
+        with span("detect_accounts", target=target_name):
+            accounts = await ocr_pool.run(detect_youtube_accounts, image)
+            account_names = [a['name'] for a in accounts]
+            annotate(accounts=account_names)
         
-        account_names = [a['name'] for a in accounts]
         position = find_account_position(target_name, accounts)
+        if account_names:
+            await _save_layout(device_id, account_names, band_hash)
         
         return position, account_names
     except Exception as e:
@@ -0,0 +1,216 @@
+"""
+Fake adb server
+
+在本機 port 上實作 adb server 的 smart-socket 協定 (host:devices / host:connect /
+host:transport + exec: / shell: / sync: RECV)，後面接一台模擬的電視：記錄按鍵、
+依 `am start` / `am force-stop` 更新目前焦點、`screencap` 回傳預先畫好的畫面、
+`sync:` 從 `FakeDevice.files` 讀檔，每個指令加上固定的裝置延遲。`host:bench-stats` 回傳統計 (JSON)，`host:bench-reset` 歸零。
+
+Usage:
+    python -m benchmarks.fake_adb --port 15037 --latency-ms 5
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import re
+import shlex
+import struct
+
+from benchmarks.screenshots import to_screencap, who_is_watching
+
+
+# sync: DATA 每一塊的最大長度 (和 adbd 相同)
+SYNC_DATA_MAX = 64 * 1024
+
+LAUNCHER = ("com.google.android.tvlauncher", "com.google.android.tvlauncher.MainActivity")
+
+
+class FakeDevice:
+    """Simulated Android TV"""
+
+    def __init__(self, serial: str, latency: float, time_scale: float):
+        self.serial = serial
+        self.latency = latency
+        self.time_scale = time_scale
+        self.focus = LAUNCHER
+        self.screen = who_is_watching()
+        # sync: RECV 可以讀取的檔案 (path → 內容)
+        self.files: dict[str, bytes] = {}
+        self.reset()
+
+    def reset(self) -> None:
+        self.commands = 0
+        self.keys: list[int] = []
+
+    def stats(self) -> dict:
+        return {"serial": self.serial, "commands": self.commands, "keys": len(self.keys), "focus": "/".join(self.focus)}
+
+    async def run(self, line: str) -> str:
+        """執行一行 shell 指令 (可能以 ; 串接多個)"""
+        output = []
+        for cmd in line.split(";"):
+            cmd = cmd.strip()
+            if cmd:
+                output.append(await self._run_one(cmd))
+        return "".join(output)
+
+    async def _run_one(self, cmd: str) -> str:
+        self.commands += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if cmd.startswith("printf "):
+            # sentinel: printf '\n<sentinel>\n'
+            return shlex.split(cmd)[1].encode().decode("unicode_escape")
+        if cmd.startswith("sleep "):
+            await asyncio.sleep(float(cmd.split()[1]) * self.time_scale)
+            return ""
+        if cmd.startswith("input keyevent "):
+            self.keys.extend(int(k) for k in cmd.split()[2:])
+            return ""
+        if cmd.startswith("am start"):
+            if match := re.search(r"-n (\S+)/(\S+)", cmd):
+                self.focus = (match.group(1), match.group(2))
+            elif match := re.search(r"(\S+)$", cmd):
+                self.focus = (match.group(1), "MainActivity")
+            return "Starting: Intent { ... }\n"
+        if cmd.startswith("am force-stop "):
+            if self.focus[0] == cmd.split()[-1]:
+                self.focus = LAUNCHER
+            return ""
+        if cmd.startswith("dumpsys window"):
+            return f"  mCurrentFocus=Window{{1a2b3c u0 {self.focus[0]}/{self.focus[1]}}}\n"
+        if cmd.startswith("getprop"):
+            return "FakeTV\n"
+        return ""
+
+    def screencap(self, png: bool) -> bytes:
+        if not png:
+            return to_screencap(self.screen)
+        buffer = io.BytesIO()
+        self.screen.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+
+async def _read_request(reader: asyncio.StreamReader) -> str:
+    length = int(await reader.readexactly(4), 16)
+    return (await reader.readexactly(length)).decode()
+
+
+def _okay(writer: asyncio.StreamWriter, payload: str | None = None) -> None:
+    writer.write(b"OKAY")
+    if payload is not None:
+        data = payload.encode()
+        writer.write(b"%04x" % len(data) + data)
+
+
+def _fail(writer: asyncio.StreamWriter, message: str) -> None:
+    data = message.encode()
+    writer.write(b"FAIL" + b"%04x" % len(data) + data)
+
+
+def _sync_packet(cmd: bytes, data: bytes = b"") -> bytes:
+    return cmd + struct.pack("<I", len(data)) + data
+
+
+async def _serve_sync(device: FakeDevice, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """sync: 子協定，只實作 RECV (pull) 與 QUIT"""
+    while True:
+        header = await reader.readexactly(8)
+        cmd, length = header[:4], struct.unpack("<I", header[4:])[0]
+        if cmd == b"QUIT":
+            return
+        path = (await reader.readexactly(length)).decode()
+        if cmd != b"RECV":
+            writer.write(_sync_packet(b"FAIL", f"unsupported sync command {cmd!r}".encode()))
+            return
+        device.commands += 1
+        data = device.files.get(path)
+        if data is None:
+            writer.write(_sync_packet(b"FAIL", f"remote object '{path}' does not exist".encode()))
+        else:
+            for offset in range(0, len(data), SYNC_DATA_MAX):
+                writer.write(_sync_packet(b"DATA", data[offset:offset + SYNC_DATA_MAX]))
+            writer.write(_sync_packet(b"DONE"))
+        await writer.drain()
+
+
+class FakeAdbServer:
+    def __init__(self, device: FakeDevice):
+        self.device = device
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await self._handle(reader, writer)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        request = await _read_request(reader)
+        device = self.device
+
+        if request == "host:devices":
+            return _okay(writer, f"{device.serial}\tdevice\n")
+        if request.startswith("host:connect:"):
+            return _okay(writer, f"already connected to {request.split(':', 2)[2]}")
+        if request.startswith("host:disconnect:"):
+            return _okay(writer, f"disconnected {request.split(':', 2)[2]}")
+        if request == "host:bench-stats":
+            return _okay(writer, json.dumps(device.stats()))
+        if request == "host:bench-reset":
+            device.reset()
+            return _okay(writer, "")
+        if not request.startswith("host:transport:"):
+            return _fail(writer, f"unknown service {request}")
+        if request.split(":", 2)[2] != device.serial:
+            return _fail(writer, f"device '{request.split(':', 2)[2]}' not found")
+
+        _okay(writer)
+        service = await _read_request(reader)
+        if service.startswith("exec:screencap"):
+            _okay(writer)
+            writer.write(device.screencap(png="-p" in service))
+        elif service.startswith("exec:sh"):
+            # 長駐 shell：一行一個指令
+            _okay(writer)
+            await writer.drain()
+            while line := await reader.readline():
+                writer.write((await device.run(line.decode())).encode())
+                await writer.drain()
+        elif service == "sync:":
+            _okay(writer)
+            await _serve_sync(device, reader, writer)
+        elif service.startswith(("shell:", "exec:")):
+            _okay(writer)
+            writer.write((await device.run(service.split(":", 1)[1])).encode())
+        else:
+            _fail(writer, f"unsupported service {service}")
+
+
+async def serve(port: int, serial: str, latency_ms: float, time_scale: float) -> None:
+    server = FakeAdbServer(FakeDevice(serial, latency_ms / 1000, time_scale))
+    async with await asyncio.start_server(server.handle, "127.0.0.1", port) as s:
+        print(f"fake adb server on 127.0.0.1:{port} ({serial}, {latency_ms}ms/command)", flush=True)
+        await s.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=15037)
+    parser.add_argument("--serial", default="bench-tv:5555")
+    parser.add_argument("--latency-ms", type=float, default=5, help="每個裝置指令的模擬延遲")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="裝置端 sleep 的倍率 (0 = 不等待)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.port, args.serial, args.latency_ms, args.time_scale))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Fake OpenAI-compatible LLM
+
+代替 LiteLLM 的 stub：依使用者訊息中的關鍵字回傳預先寫好的 tool calls，
+支援 streaming (SSE, tool_call 參數分段送出) 與一般回應，延遲可調整。
+
+Usage:
+    python -m benchmarks.fake_llm --port 14000 --first-token-ms 300 --chunk-ms 30
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+# 使用者訊息包含 keyword → 回傳的 tool calls (第一個符合的)
+SCRIPTS = [
+    ("netflix", [{"name": "netflix_search", "args": {"query": "紙房子"}}]),
+    ("新聞", [{"name": "youtube_launch", "args": {}}, {"name": "youtube_search", "args": {"query": "新聞直播"}}]),
+    ("音樂", [{"name": "youtube_search", "args": {"query": "relaxing music"}}]),
+    ("頻道", [{"name": "youtube_channel", "args": {"channel": "@LinusTechTips"}}]),
+]
+FALLBACK = [{"name": "tv_current_app", "args": {}}]
+
+ARG_CHUNKS = 4
+
+app = FastAPI()
+config = {"first_token": 0.3, "chunk": 0.03}
+
+
+def _script_for(messages: list[dict]) -> list[dict]:
+    text = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "").lower()
+    for keyword, tool_calls in SCRIPTS:
+        if keyword in text:
+            return tool_calls
+    return FALLBACK
+
+
+def _usage(tool_calls: list[dict]) -> dict:
+    completion = sum(len(json.dumps(tc["args"])) for tc in tool_calls) + 10
+    return {"prompt_tokens": 800, "completion_tokens": completion, "total_tokens": 800 + completion}
+
+
+def _chunk(model: str, delta: dict, finish_reason: str | None = None) -> str:
+    body = {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+
+async def _stream(model: str, tool_calls: list[dict], include_usage: bool):
+    await asyncio.sleep(config["first_token"])
+    for index, tc in enumerate(tool_calls):
+        call = {"index": index, "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                "function": {"name": tc["name"], "arguments": ""}}
+        yield _chunk(model, {"role": "assistant", "tool_calls": [call]})
+
+        arguments = json.dumps(tc["args"], ensure_ascii=False)
+        size = max(1, -(-len(arguments) // ARG_CHUNKS))
+        for start in range(0, len(arguments), size):
+            await asyncio.sleep(config["chunk"])
+            piece = {"index": index, "function": {"arguments": arguments[start:start + size]}}
+            yield _chunk(model, {"tool_calls": [piece]})
+
+    yield _chunk(model, {}, "tool_calls")
+    if include_usage:
+        usage = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": model, "choices": [], "usage": _usage(tool_calls)}
+        yield f"data: {json.dumps(usage)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.get("/models")
+async def models():
+    return {"object": "list", "data": [{"id": "bench", "object": "model"}]}
+
+
+@app.post("/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "bench")
+    tool_calls = _script_for(body.get("messages", []))
+
+    if body.get("stream"):
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        return StreamingResponse(_stream(model, tool_calls, include_usage), media_type="text/event-stream")
+
+    await asyncio.sleep(config["first_token"] + config["chunk"] * ARG_CHUNKS * len(tool_calls))
+    message = {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [
+            {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+             "function": {"name": tc["name"], "arguments": json.dumps(tc["args"], ensure_ascii=False)}}
+            for tc in tool_calls
+        ],
+    }
+    return {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls"}],
+        "usage": _usage(tool_calls),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=14000)
+    parser.add_argument("--first-token-ms", type=float, default=300, help="第一個 chunk 前的延遲")
+    parser.add_argument("--chunk-ms", type=float, default=30, help="每個參數 chunk 之間的延遲")
+    args = parser.parse_args()
+    config["first_token"] = args.first_token_ms / 1000
+    config["chunk"] = args.chunk_ms / 1000
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
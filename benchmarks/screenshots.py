@@ -0,0 +1,50 @@
+"""
+Canned screenshots for the OCR path
+
+用 PIL 畫出 YouTube「誰在觀看」畫面，輸出成 `screencap` 的 raw 格式
+(width, height, format, colorspace 各 4 bytes + RGBA)，不需要真的電視。
+"""
+
+import struct
+
+from PIL import Image, ImageDraw, ImageFont
+
+
+ACCOUNT_NAMES = ["Alice", "Bob", "Carol", "David"]
+
+# 1080p 座標：名稱所在的列與每個帳號的間距 (和 YOUTUBE_ACCOUNT_BAND 一致)
+NAME_Y = 630
+FIRST_X = 300
+SPACING = 220
+FONT_SIZE = 28
+
+
+def name_positions(names: list[str] = ACCOUNT_NAMES) -> list[tuple[str, int]]:
+    """每個帳號名稱左緣的 x 座標 (1080p)"""
+    return [(name, FIRST_X + i * SPACING) for i, name in enumerate(names)]
+
+
+def name_width(name: str) -> int:
+    """帳號名稱在 1080p 畫面上的寬度 (px)"""
+    return round(ImageFont.load_default(size=FONT_SIZE).getlength(name))
+
+
+def who_is_watching(names: list[str] = ACCOUNT_NAMES, size: tuple[int, int] = (1920, 1080)) -> Image.Image:
+    """深色背景、白色帳號名稱的帳號選擇畫面"""
+    scale = size[1] / 1080
+    img = Image.new("RGBA", size, (15, 15, 15, 255))
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=round(FONT_SIZE * scale))
+    draw.text((round(40 * scale), round(40 * scale)), "YouTube", fill=(230, 230, 230, 255), font=font)
+    for name, x in name_positions(names):
+        # 帳號頭像
+        cx = round((x + 30) * scale)
+        draw.ellipse((cx - round(60 * scale), round(480 * scale), cx + round(60 * scale), round(600 * scale)), fill=(90, 90, 160, 255))
+        draw.text((round(x * scale), round(NAME_Y * scale)), name, fill=(255, 255, 255, 255), font=font)
+    return img
+
+
+def to_screencap(img: Image.Image) -> bytes:
+    """PIL Image → `screencap` raw bytes (Android 9+ 的 16 bytes header)"""
+    rgba = img.convert("RGBA")
+    return struct.pack("<IIII", rgba.width, rgba.height, 1, 0) + rgba.tobytes()
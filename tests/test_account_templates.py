@@ -0,0 +1,93 @@
+"""
+Template matching on the canned "Who's watching" screen (benchmarks/screenshots.py)
+"""
+
+import threading
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.services import account_templates, youtube_ocr
+from app.services.youtube_ocr import crop_account_band, detect_youtube_accounts, find_account_position
+from benchmarks.screenshots import ACCOUNT_NAMES, name_positions, name_width, who_is_watching
+
+
+@pytest.fixture(autouse=True)
+def templates(monkeypatch):
+    monkeypatch.setattr(account_templates, "_templates", {})
+    return account_templates._templates
+
+
+def enroll(names: list[str]) -> None:
+    """用已知的名稱位置登錄樣板 (實際環境是 Tesseract 辨識一次)"""
+    band, (left, _), scale = crop_account_band(who_is_watching())
+    pixels = account_templates.to_array(band)
+    padding = settings.YOUTUBE_TEMPLATE_PADDING
+    for name, x in name_positions():
+        if name in names:
+            start = x - round(left * scale) - padding
+            account_templates._templates[name] = pixels[:, start:start + name_width(name) + 2 * padding].copy()
+
+
+def match(img) -> list[str]:
+    band, (left, top), scale = crop_account_band(img)
+    return [a["name"] for a in account_templates.match_accounts(band, round(left * scale), round(top * scale))]
+
+
+def test_all_enrolled():
+    enroll(ACCOUNT_NAMES)
+    assert match(who_is_watching()) == ACCOUNT_NAMES
+
+
+def test_unenrolled_account_between_matches_is_not_trusted():
+    enroll(["Alice", "Carol", "David"])
+    assert match(who_is_watching()) == []
+
+
+def test_unenrolled_account_falls_back_to_ocr(monkeypatch):
+    enroll(["Alice", "Carol", "David"])
+    ocr_accounts = [{"name": name, "x": x, "y": 630} for name, x in name_positions()]
+    monkeypatch.setattr(youtube_ocr, "_ocr_accounts", lambda band, offset, scale: ocr_accounts)
+
+    accounts = detect_youtube_accounts(who_is_watching())
+    assert find_account_position("Carol", accounts) == 3
+
+
+def test_unmatched_names_after_the_last_match_are_ignored():
+    # 例如「新增帳戶」、訪客，或最右邊還沒登錄的帳號
+    enroll(ACCOUNT_NAMES)
+    assert match(who_is_watching(ACCOUNT_NAMES + ["Guest"])) == ACCOUNT_NAMES
+
+
+def test_leading_enrolled_accounts_keep_their_positions(templates):
+    enroll(["Alice", "Bob"])
+    assert match(who_is_watching()) == ["Alice", "Bob"]
+
+
+def test_templates_changing_while_matching(templates):
+    # 另一台電視登錄樣板時，OCR worker thread 正在比對
+    enroll(ACCOUNT_NAMES)
+    band, (left, top), scale = crop_account_band(who_is_watching())
+    errors = []
+    done = threading.Event()
+
+    def matcher():
+        try:
+            while not done.is_set():
+                account_templates.match_accounts(band, round(left * scale), round(top * scale))
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=matcher)
+    thread.start()
+    extra = np.zeros((band.height, 4), dtype=np.float32)
+    for i in range(20000):
+        templates[f"extra{i % 50}"] = extra
+        if i % 50 == 49:
+            for j in range(50):
+                templates.pop(f"extra{j}")
+    done.set()
+    thread.join()
+
+    assert errors == []
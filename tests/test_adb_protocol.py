@@ -0,0 +1,80 @@
+"""
+ADB host protocol client，以 benchmarks.fake_adb 當作 adb server
+"""
+
+import asyncio
+
+import pytest
+
+from app.services import adb, adb_protocol
+from app.services.adb_protocol import AdbProtocolError, AdbServerClient
+from benchmarks.fake_adb import SYNC_DATA_MAX, FakeAdbServer, FakeDevice
+
+SERIAL = "fake-tv:5555"
+
+
+async def with_server(test):
+    """在隨機 port 上啟動 fake adb server，把 (device, client) 交給 test"""
+    device = FakeDevice(SERIAL, latency=0, time_scale=0)
+    server = await asyncio.start_server(FakeAdbServer(device).handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        return await test(device, AdbServerClient("127.0.0.1", port))
+
+
+def test_devices():
+    async def test(device, client):
+        return await client.devices()
+
+    assert asyncio.run(with_server(test)) == {SERIAL: "device"}
+
+
+def test_shell():
+    async def test(device, client):
+        return await client.shell(SERIAL, "getprop ro.product.model")
+
+    assert asyncio.run(with_server(test)) == "FakeTV"
+
+
+def test_shell_unknown_device():
+    async def test(device, client):
+        await client.shell("other-tv:5555", "getprop ro.product.model")
+
+    with pytest.raises(AdbProtocolError, match="not found"):
+        asyncio.run(with_server(test))
+
+
+def test_pull_multiple_chunks():
+    # 超過一個 DATA 封包，確認會把所有 chunk 接起來
+    content = bytes(range(256)) * (SYNC_DATA_MAX // 128 + 1)
+
+    async def test(device, client):
+        device.files["/sdcard/big.bin"] = content
+        return await client.pull(SERIAL, "/sdcard/big.bin")
+
+    assert asyncio.run(with_server(test)) == content
+
+
+def test_pull_missing_file():
+    async def test(device, client):
+        await client.pull(SERIAL, "/sdcard/missing.png")
+
+    with pytest.raises(AdbProtocolError, match="does not exist"):
+        asyncio.run(with_server(test))
+
+
+def test_adb_pull_over_socket(monkeypatch, tmp_path):
+    monkeypatch.setattr(adb.settings, "ADB_TRANSPORT", "socket")
+    local = tmp_path / "screen.png"
+
+    async def test(device, client):
+        device.files["/sdcard/screen.png"] = b"\x89PNG fake"
+        monkeypatch.setattr(adb_protocol, "_client", client)
+        token = adb.current_device.set(SERIAL)
+        try:
+            await adb.adb_pull("/sdcard/screen.png", str(local))
+        finally:
+            adb.current_device.reset(token)
+
+    asyncio.run(with_server(test))
+    assert local.read_bytes() == b"\x89PNG fake"
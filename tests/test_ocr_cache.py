@@ -0,0 +1,44 @@
+"""
+OCR 結果快取 (多個 OCR worker thread 同時讀寫)
+"""
+
+import threading
+
+from app.config import settings
+from app.services import youtube_ocr
+from app.services.youtube_ocr import _cache_accounts, _cached_accounts
+
+
+def test_concurrent_lookup_and_store(monkeypatch):
+    monkeypatch.setattr(settings, "OCR_CACHE_SIZE", 8)
+    monkeypatch.setattr(settings, "OCR_HASH_MAX_DISTANCE", 0)
+    youtube_ocr._ocr_cache.clear()
+    errors = []
+
+    def run(fn):
+        try:
+            for i in range(20000):
+                fn(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [
+        threading.Thread(target=run, args=(lambda i: _cache_accounts(i, [{"name": "Alice", "x": i}]),)),
+        threading.Thread(target=run, args=(lambda i: _cached_accounts(-1),)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    youtube_ocr._ocr_cache.clear()
+
+    assert errors == []
+
+
+def test_lookup_returns_copy():
+    youtube_ocr._ocr_cache.clear()
+    _cache_accounts(0b1010, [{"name": "Alice", "x": 10}])
+    cached = _cached_accounts(0b1010)
+    cached[0]["x"] = 99
+    assert _cached_accounts(0b1010) == [{"name": "Alice", "x": 10}]
+    youtube_ocr._ocr_cache.clear()
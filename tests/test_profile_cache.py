@@ -0,0 +1,69 @@
+"""
+User profile 快取：查詢期間被寫入失效時不能把舊資料放回快取
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.config import settings
+from app.services import database
+
+
+class FakeConnection:
+    def __init__(self, rows: dict[str, dict], gate: asyncio.Event | None):
+        self.rows = rows
+        self.gate = gate
+
+    async def fetchrow(self, query: str, user_id: str):
+        if self.gate is not None:
+            await self.gate.wait()
+        return self.rows.get(user_id)
+
+
+class FakePool:
+    def __init__(self, rows: dict[str, dict]):
+        self.rows = rows
+        self.gate: asyncio.Event | None = None
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield FakeConnection(dict(self.rows), self.gate)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakePool({"alice": {"user_id": "alice", "netflix_profile_index": 1}})
+    monkeypatch.setattr(database, "db_pool", pool)
+    monkeypatch.setattr(database, "_profile_cache", database.OrderedDict())
+    monkeypatch.setattr(settings, "PROFILE_CACHE_NOTIFY", False)
+    return pool
+
+
+def test_lookup_is_cached(pool):
+    async def main():
+        await database.get_user_profile("alice")
+        pool.rows["alice"] = {"user_id": "alice", "netflix_profile_index": 2}
+        return await database.get_user_profile("alice")
+
+    assert asyncio.run(main())["netflix_profile_index"] == 1
+
+
+def test_invalidation_during_lookup_skips_the_cache_fill(pool):
+    async def main():
+        pool.gate = asyncio.Event()
+        # 查詢讀到舊的 row，但在回來之前 profile 被更新並失效
+        lookup = asyncio.create_task(database.get_user_profile("alice"))
+        await asyncio.sleep(0)
+        pool.rows["alice"] = {"user_id": "alice", "netflix_profile_index": 2}
+        await database.invalidate_user_profile("alice")
+        pool.gate.set()
+        stale = await lookup
+
+        pool.gate = None
+        return stale, await database.get_user_profile("alice")
+
+    stale, fresh = asyncio.run(main())
+    assert stale["netflix_profile_index"] == 1
+    assert fresh["netflix_profile_index"] == 2
@@ -0,0 +1,52 @@
+"""
+排程器的 job 合併與導航 job 取消規則
+"""
+
+import pytest
+
+from app.services.scheduler import Job, _merge
+
+
+async def noop(tool_calls):
+    return None
+
+
+def job(name: str, **args) -> Job:
+    return Job(tool_calls=[{"name": name, "args": args}], runner=noop)
+
+
+@pytest.mark.parametrize("first, second, merged", [
+    (5, 5, 20),    # 各自執行是各按一次 (共 20 秒)
+    (10, 25, 30),
+    (30, 30, 60),
+])
+def test_rewind_merges_what_would_actually_run(first, second, merged):
+    pending = job("rewind", app="youtube", seconds=first)
+    assert _merge(pending, job("rewind", app="youtube", seconds=second))
+    assert pending.tool_calls[0]["args"]["seconds"] == merged
+
+
+def test_rewind_over_the_limit_is_not_merged():
+    pending = job("fast_forward", app="netflix", seconds=60)
+    assert not _merge(pending, job("fast_forward", app="netflix", seconds=5))
+    assert pending.tool_calls[0]["args"]["seconds"] == 60
+
+
+def test_volume_steps_are_summed():
+    pending = job("tv_volume", action="up")
+    assert _merge(pending, job("tv_volume", action="up", steps=2))
+    assert pending.tool_calls[0]["args"]["steps"] == 3
+
+
+@pytest.mark.parametrize("key", ["up", "down", "left", "right"])
+def test_direction_keys_are_navigation(key):
+    assert job("tv_remote", key=key).is_navigation
+
+
+@pytest.mark.parametrize("key", ["ok", "enter", "menu", "search", "home", "back"])
+def test_other_remote_keys_are_not_cancellable(key):
+    assert not job("tv_remote", key=key).is_navigation
+
+
+def test_navigate_is_navigation():
+    assert job("tv_navigate", direction="down", steps=3).is_navigation
@@ -0,0 +1,52 @@
+"""
+選擇帳號 / profile 之後的畫面轉場偵測
+"""
+
+import asyncio
+
+from PIL import Image, ImageDraw
+
+from app.config import settings
+from app.services import screen
+from benchmarks.screenshots import who_is_watching
+
+PICKER = who_is_watching()
+
+
+def home() -> Image.Image:
+    img = Image.new("RGB", PICKER.size, (15, 15, 15))
+    draw = ImageDraw.Draw(img)
+    for i in range(6):
+        draw.rectangle((100 + i * 300, 300, 350 + i * 300, 500), fill=(200, 60, 60))
+    return img
+
+
+def run_with_frames(monkeypatch, frames: list[Image.Image], timeout: float) -> tuple[bool, int]:
+    """依序回傳 frames (最後一張重複)，回傳 (結果, 截圖次數)"""
+    captured = 0
+
+    async def capture_screen():
+        nonlocal captured
+        captured += 1
+        return frames[min(captured, len(frames)) - 1]
+
+    monkeypatch.setattr(screen, "capture_screen", capture_screen)
+    monkeypatch.setattr(settings, "READY_POLL_INTERVAL", 0.01)
+
+    async def main():
+        before = screen.image_hash(PICKER, screen.SCREEN_HASH_SIZE)
+        return await screen.wait_for_screen_change(before, timeout)
+
+    return asyncio.run(main()), captured
+
+
+def test_waits_for_new_screen_to_settle(monkeypatch):
+    changed, captured = run_with_frames(monkeypatch, [PICKER, PICKER, home(), home()], timeout=5)
+    assert changed
+    assert captured == 4
+
+
+def test_times_out_when_screen_does_not_change(monkeypatch):
+    changed, captured = run_with_frames(monkeypatch, [PICKER], timeout=0.1)
+    assert not changed
+    assert captured > 2
@@ -0,0 +1,53 @@
+"""
+screencap raw framebuffer decoding
+"""
+
+import asyncio
+import io
+import struct
+
+import pytest
+from PIL import Image
+
+from app.services import youtube_ocr
+from app.services.youtube_ocr import UnsupportedScreencapFormat, capture_screen, decode_screencap
+
+PIXEL = (10, 20, 30)
+
+
+def raw(pixel_format: int, pixel: bytes, size: tuple[int, int] = (4, 2)) -> bytes:
+    return struct.pack("<IIII", *size, pixel_format, 0) + pixel * (size[0] * size[1])
+
+
+@pytest.mark.parametrize("pixel_format, pixel", [
+    (1, bytes([*PIXEL, 255])),  # RGBA_8888
+    (2, bytes([*PIXEL, 0])),    # RGBX_8888
+    (5, bytes([*PIXEL[::-1], 255])),  # BGRA_8888
+])
+def test_decode_pixel_formats(pixel_format, pixel):
+    img = decode_screencap(raw(pixel_format, pixel))
+    assert img.size == (4, 2)
+    assert img.convert("RGB").getpixel((3, 1)) == PIXEL
+
+
+def test_unsupported_pixel_format():
+    with pytest.raises(UnsupportedScreencapFormat):
+        decode_screencap(raw(4, bytes(2)))  # RGB_565
+
+
+def test_capture_falls_back_to_png(monkeypatch):
+    png = io.BytesIO()
+    Image.new("RGB", (4, 2), PIXEL).save(png, format="PNG")
+    calls = []
+
+    async def screencap(png_format: bool = False) -> bytes:
+        calls.append(png_format)
+        return png.getvalue() if png_format else raw(4, bytes(2))
+
+    monkeypatch.setattr(youtube_ocr, "screencap", lambda png=False: screencap(png))
+    monkeypatch.setattr(youtube_ocr, "_png_devices", set())
+
+    assert asyncio.run(capture_screen()).convert("RGB").getpixel((0, 0)) == PIXEL
+    # 之後不再嘗試 raw
+    asyncio.run(capture_screen())
+    assert calls == [False, True, True]